@@ -0,0 +1,63 @@
+import os
+import json
+import time
+import argparse
+from ocr_rules import get_rules
+from ocr_store import open_store, STORE_PATH, JSON_PATH
+
+# Pages re-ocr.py --batch could not title, waiting for a human
+REVIEW_PATH = "review_queue.json"
+
+def write_review(entries, path=REVIEW_PATH, source=STORE_PATH):
+    """Save the review queue; a reviewer fills in each entry's "title" (and may correct its "text")"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "source": source,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "instructions": "Fill in 'title' for each page (leave it empty to keep the page untitled), "
+                            "then run: python apply_review.py",
+            "pages": entries
+        }, f, ensure_ascii=False, indent=2)
+
+def apply_review(store, review):
+    """Merge reviewed titles into an ocr_store.OCRStore, one transaction per page; returns (applied, skipped) page counts"""
+    rules = get_rules()
+    applied = skipped = 0
+    for entry in review["pages"]:
+        title = (entry.get("title") or "").strip()
+        poem_id = store.poem_for_page(entry["filename"])
+        if not title or poem_id is None:
+            skipped += 1
+            continue
+        with store.transaction():
+            store.split_out_page(poem_id, {
+                "filename": entry["filename"],
+                "title": title,
+                "text": rules.clean_text(entry["text"], title),
+                "pages": [entry["filename"]]
+            })
+        applied += 1
+        print(f"  ✓ {entry['filename']}: '{title}'")
+    return applied, skipped
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge human-entered titles from a re-ocr.py review file into the result store")
+    parser.add_argument("review", nargs="?", default=REVIEW_PATH, help=f"review file (default {REVIEW_PATH})")
+    parser.add_argument("--store", default=STORE_PATH,
+                        help=f"SQLite result store shared with re-ocr.py (default {STORE_PATH})")
+    parser.add_argument("--output", default=JSON_PATH,
+                        help=f"poems file the store is imported from when newer and exported to afterwards (default {JSON_PATH})")
+    parser.add_argument("--rules", metavar="PATH",
+                        help="title/metadata rules for this collection (default ocr_rules.json)")
+    args = parser.parse_args()
+    if args.rules:
+        os.environ["OCR_RULES"] = args.rules
+
+    with open(args.review, "r", encoding="utf-8") as f:
+        review = json.load(f)
+
+    with open_store(args.store, args.output) as store:
+        applied, skipped = apply_review(store, review)
+        if applied:
+            store.export_json(args.output)
+    print(f"\nApplied {applied} titles to {args.store} and {args.output}, {skipped} pages left untitled")
@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import argparse
+from ocr_journal import read_journal, write_jsonl, JOURNAL_PATH
+from ocr_rules import get_rules
+
+def latest_pages(records, order="filename"):
+    """One record per page (the last one written wins), sorted by filename or kept in journal order"""
+    pages = {}
+    for record in records:
+        pages.pop(record["filename"], None)  # Re-insert so journal order follows the latest write
+        pages[record["filename"]] = record
+    if order == "filename":
+        return [pages[filename] for filename in sorted(pages)]
+    return list(pages.values())
+
+def retitle(records):
+    """Re-derive titles and continuation flags from the raw page text with the current rules"""
+    rules = get_rules()
+    for record in records:
+        yield dict(record, title=rules.extract_title(record["text"]), is_continuation=rules.is_continuation(record["text"]))
+
+def assemble(page_records):
+    """Group per-page records into poems: continuation pages join the previous poem, same titles merge.
+
+    Runs in one pass: poems are indexed by title, the most recently started
+    poem is tracked directly, and each poem's text is collected as a list of
+    chunks that is joined once at the end.
+    """
+    rules = get_rules()
+    poems = {}  # Title -> poem, in the order poems were first seen
+    last_poem = None  # Most recently started poem, which continuation pages extend
+    for record in page_records:
+        filename = record["filename"]
+        title = record["title"]
+        clean_text = rules.clean_text(record["text"], title)
+
+        if record["is_continuation"] and last_poem is not None:
+            poem = last_poem
+        elif title in poems:
+            # Same title, merge content
+            poem = poems[title]
+        else:
+            # Brand new poem
+            poem = last_poem = poems[title] = {"title": title, "chunks": [], "pages": []}
+        poem["chunks"].append(clean_text)
+        poem["pages"].append(filename)
+
+        # Pages a guardrail cut off stay marked on their poem for reprocessing
+        if record.get("stop_reason"):
+            poem.setdefault("flags", {})[filename] = record["stop_reason"]
+        # Confidence scores (ocr.py --confidence) travel with the poem, per page
+        if record.get("confidence") is not None:
+            poem.setdefault("confidence", {})[filename] = {"page": record["confidence"], "lines": record.get("lines", [])}
+
+    # Convert to list format for JSON output
+    ocr_results = []
+    for poem_data in poems.values():
+        poem_result = {
+            "filename": poem_data["pages"][0],  # First page filename
+            "title": poem_data["title"],
+            "text": "\n\n".join(poem_data["chunks"]),
+            "pages": poem_data["pages"]  # All pages for this poem
+        }
+        for key in ("flags", "confidence"):
+            if key in poem_data:
+                poem_result[key] = poem_data[key]
+        ocr_results.append(poem_result)
+    return ocr_results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Group per-page OCR records into poems without touching the model")
+    parser.add_argument("pages", nargs="?", default=JOURNAL_PATH,
+                        help=f"per-page JSONL written by ocr.py (default {JOURNAL_PATH})")
+    parser.add_argument("--output", default="ocr_output.json",
+                        help="JSON list of poems, or one poem per line if it ends in .jsonl (streamed by poem_reader.py)")
+    parser.add_argument("--order", choices=("filename", "journal"), default="filename",
+                        help="page order: sorted filenames (as ocr.py uses) or the order pages were written")
+    parser.add_argument("--keep-titles", action="store_true",
+                        help="use the titles stored with each page instead of re-deriving them with the current rules")
+    parser.add_argument("--rules", metavar="PATH",
+                        help="title/metadata rules for this collection (default ocr_rules.json)")
+    args = parser.parse_args()
+    if args.rules:
+        os.environ["OCR_RULES"] = args.rules
+
+    started = time.perf_counter()
+    records = latest_pages(read_journal(args.pages), args.order)
+    if not args.keep_titles:
+        records = retitle(records)
+    ocr_results = assemble(records)
+
+    if args.output.endswith(".jsonl"):
+        write_jsonl(ocr_results, args.output)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(ocr_results, f, ensure_ascii=False, indent=2)
+    print(f"Assembled {len(ocr_results)} poems in {time.perf_counter() - started:.2f}s, saved to {args.output}")
@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+# Benchmark defaults: small enough to run on a laptop CPU in a minute or two
+PAGES = 12
+BATCH_SIZE = 4
+MAX_NEW_TOKENS = 32
+LONG_EDGE = 448
+SEED = 1234
+
+# Relative slowdown (or memory growth) that --compare reports as a regression
+REGRESSION_THRESHOLD = 0.10
+
+WORDS = ("moon", "river", "stone", "morning", "silver", "harbor", "quiet", "lantern",
+         "autumn", "window", "shadow", "garden", "letter", "distant", "bells", "snow")
+
+def build_tiny_model():
+    """A randomly initialized Qwen2-VL with a byte-level tokenizer, built without any download"""
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers, decoders
+    from transformers import (Qwen2TokenizerFast, Qwen2VLConfig, Qwen2VLForConditionalGeneration,
+                              Qwen2VLImageProcessor, Qwen2VLProcessor)
+
+    special_tokens = ["<|endoftext|>", "<|im_start|>", "<|im_end|>", "<|vision_start|>",
+                      "<|vision_end|>", "<|image_pad|>", "<|video_pad|>"]
+    byte_alphabet = pre_tokenizers.ByteLevel.alphabet()
+    vocab = {token: index for index, token in enumerate(special_tokens + sorted(byte_alphabet))}
+    backend = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+    backend.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    backend.decoder = decoders.ByteLevel()
+    # Qwen2VLProcessor only accepts Qwen2 tokenizer classes
+    tokenizer = Qwen2TokenizerFast(tokenizer_object=backend, eos_token="<|im_end|>", unk_token=None,
+                                   pad_token="<|endoftext|>", additional_special_tokens=special_tokens[1:])
+
+    chat_template = (
+        "{% for message in messages %}<|im_start|>{{ message['role'] }}\n"
+        "{% for content in message['content'] %}"
+        "{% if content['type'] == 'image' %}<|vision_start|><|image_pad|><|vision_end|>"
+        "{% else %}{{ content['text'] }}{% endif %}{% endfor %}<|im_end|>\n{% endfor %}"
+        "{% if add_generation_prompt %}<|im_start|>assistant\n{% endif %}"
+    )
+    # transformers >= 4.52 also wants a video processor (it never sees a video here, but needs torchvision)
+    video_processor = {}
+    try:
+        from transformers import Qwen2VLVideoProcessor
+    except ImportError:
+        pass
+    else:
+        video_processor["video_processor"] = Qwen2VLVideoProcessor()
+    processor = Qwen2VLProcessor(image_processor=Qwen2VLImageProcessor(), tokenizer=tokenizer,
+                                 chat_template=chat_template, **video_processor)
+    processor.tokenizer.padding_side = "left"
+
+    token_id = tokenizer.convert_tokens_to_ids
+    config = Qwen2VLConfig(
+        vocab_size=len(vocab),
+        hidden_size=64,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=4096,
+        rope_scaling={"type": "mrope", "mrope_section": [2, 3, 3]},  # Sums to head_dim / 2
+        vision_config={"depth": 2, "embed_dim": 32, "hidden_size": 64, "num_heads": 2, "mlp_ratio": 2,
+                       "patch_size": 14, "spatial_merge_size": 2, "temporal_patch_size": 2},
+        bos_token_id=token_id("<|im_start|>"),
+        eos_token_id=token_id("<|im_end|>"),
+        pad_token_id=token_id("<|endoftext|>"),
+        image_token_id=token_id("<|image_pad|>"),
+        video_token_id=token_id("<|video_pad|>"),
+        vision_start_token_id=token_id("<|vision_start|>"),
+        vision_end_token_id=token_id("<|vision_end|>"),
+    )
+    torch.manual_seed(SEED)
+    model = Qwen2VLForConditionalGeneration(config).eval()
+    model.generation_config.eos_token_id = config.eos_token_id
+    model.generation_config.pad_token_id = config.pad_token_id
+    model.generation_config.do_sample = False
+    return processor, model
+
+def make_pages(folder, count):
+    """Write synthetic poem scans (title, stanzas, the odd continuation page) as JPEGs"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(SEED)
+    paths = []
+    for index in range(count):
+        img = Image.new("RGB", (1240, 1754), "white")  # A4 at 150 dpi
+        draw = ImageDraw.Draw(img)
+        y = 120
+        if index % 3 == 2:
+            draw.text((520, y), "(continued)", fill="black")
+        else:
+            title = " ".join(rng.choice(WORDS) for _ in range(2)).upper()
+            draw.text((520, y), title, fill="black")
+        y += 80
+        for line in range(16):
+            if line % 4 == 3:
+                y += 30
+            draw.text((220, y), " ".join(rng.choice(WORDS) for _ in range(6)), fill="black")
+            y += 40
+        path = os.path.join(folder, f"{index + 1:03d}.jpg")
+        img.save(path, quality=90)
+        paths.append(path)
+    return paths
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_benchmark(pages=PAGES, batch_size=BATCH_SIZE, max_new_tokens=MAX_NEW_TOKENS, long_edge=LONG_EDGE):
+    """Run the whole ocr.py pipeline on synthetic pages with the tiny model and return the metrics"""
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList
+    import ocr
+
+    processor, model = build_tiny_model()
+    # Stand in for the real checkpoint wherever ocr.py loads it
+    ocr._loaded_models[(ocr.MODEL_ID, None)] = (processor, model)
+
+    # Time prefill vs. decode and count tokens for every generate call the pipeline makes
+    generate_stats = {"calls": 0, "prefill": 0.0, "decode": 0.0, "generated_tokens": 0, "prompt_tokens": 0}
+
+    class FirstTokenTimer(StoppingCriteria):
+        def __init__(self):
+            self.first_token_at = None
+
+        def __call__(self, input_ids, scores, **kwargs):
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+    original_generate = model.generate
+
+    def timed_generate(*args, **kwargs):
+        timer = FirstTokenTimer()
+        kwargs["stopping_criteria"] = StoppingCriteriaList(list(kwargs.get("stopping_criteria") or []) + [timer])
+        started = time.perf_counter()
+        output_ids = original_generate(*args, **kwargs)
+        finished = time.perf_counter()
+        prompt_length = kwargs["input_ids"].shape[1]
+        first_token_at = timer.first_token_at or finished
+        generate_stats["calls"] += 1
+        generate_stats["prefill"] += first_token_at - started
+        generate_stats["decode"] += finished - first_token_at
+        generate_stats["prompt_tokens"] += int(kwargs["attention_mask"].sum())
+        generate_stats["generated_tokens"] += int((output_ids[:, prompt_length:] != model.generation_config.pad_token_id).sum())
+        return output_ids
+
+    model.generate = timed_generate
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = make_pages(folder, pages)
+
+        started = time.perf_counter()
+        records = list(ocr.iter_ocr(paths, batch_size=batch_size, max_new_tokens=max_new_tokens,
+                                    pixel_budget={"long_edge": long_edge}))
+        ocr_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        poems = ocr.group_pages(records)
+        group_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with open(os.path.join(folder, "ocr_output.json"), "w", encoding="utf-8") as f:
+            json.dump(poems, f, ensure_ascii=False, indent=2)
+        write_seconds = time.perf_counter() - started
+
+    total_seconds = ocr_seconds + group_seconds + write_seconds
+
+    def stage_sum(stage):
+        return sum(record["timings"].get(stage, 0.0) for record in records)
+
+    return {
+        "pages_per_second": pages / total_seconds,
+        "tokens_per_second": generate_stats["generated_tokens"] / generate_stats["decode"] if generate_stats["decode"] else 0.0,
+        "total_seconds": total_seconds,
+        "prefill_seconds": generate_stats["prefill"],
+        "decode_seconds": generate_stats["decode"],
+        "image_load_seconds": stage_sum("load"),
+        "title_seconds": stage_sum("title"),
+        "group_seconds": group_seconds,
+        "json_write_seconds": write_seconds,
+        "generate_calls": generate_stats["calls"],
+        "prompt_tokens": generate_stats["prompt_tokens"],
+        "generated_tokens": generate_stats["generated_tokens"],
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+# Metrics where bigger is better; every other timing/memory metric is smaller-is-better
+HIGHER_IS_BETTER = {"pages_per_second", "tokens_per_second"}
+COMPARED = ("pages_per_second", "tokens_per_second", "prefill_seconds", "decode_seconds",
+            "image_load_seconds", "title_seconds", "group_seconds", "json_write_seconds", "peak_rss_mb")
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Print metric changes between two result files and return the metrics that regressed"""
+    regressions = []
+    print(f"{'metric':<22}{'baseline':>12}{'current':>12}{'change':>9}")
+    for metric in COMPARED:
+        old, new = baseline["metrics"].get(metric), current["metrics"].get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if metric in HIGHER_IS_BETTER else change
+        marker = "  REGRESSION" if worse > threshold else ""
+        print(f"{metric:<22}{old:>12.4f}{new:>12.4f}{change:>+9.1%}{marker}")
+        if marker:
+            regressions.append(metric)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline CPU benchmark of the OCR pipeline with a tiny random Qwen2-VL")
+    parser.add_argument("--pages", type=int, default=PAGES)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-new-tokens", type=int, default=MAX_NEW_TOKENS)
+    parser.add_argument("--long-edge", type=int, default=LONG_EDGE)
+    parser.add_argument("--output", default="bench_results.json", help="machine-readable results")
+    parser.add_argument("--compare", metavar="BASELINE_JSON",
+                        help="compare against an earlier results file; exit 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help=f"relative change counted as a regression (default {REGRESSION_THRESHOLD})")
+    args = parser.parse_args()
+
+    settings = {
+        "pages": args.pages,
+        "batch_size": args.batch_size,
+        "max_new_tokens": args.max_new_tokens,
+        "long_edge": args.long_edge
+    }
+    metrics = run_benchmark(**settings)
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "settings": settings,
+        "metrics": metrics
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    for metric, value in metrics.items():
+        print(f"  {metric}: {value:.4f}" if isinstance(value, float) else f"  {metric}: {value}")
+    print(f"Saved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != settings:
+            print("Warning: baseline was run with different settings")
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"\nRegressed: {', '.join(regressions)}")
+            sys.exit(1)
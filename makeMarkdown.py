@@ -1,11 +1,121 @@
+import os
 import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+from collections import deque
 from html_to_markdown import convert_to_markdown
+from poem_reader import PoemReader, poem_name
 
-# Load saved OCR results
-with open("Qari_ocr_output.json", "r", encoding="utf-8") as f:
-    pages = json.load(f)
+# One .md per poem goes in OUTPUT_DIR, next to a manifest of the source hash each was made from
+OUTPUT_DIR = "poems_md"
+MANIFEST_NAME = "manifest.json"
+BOOK_PATH = "juniors_poems.md"
+# Bump when convert_page() changes so every poem is converted again
+MARKDOWN_VERSION = 1
+# Conversions queued per pool process before the oldest result is written out
+WINDOW = 4
 
-# --- Poem Pages ---
-for i, page in enumerate(pages):
-   result = convert_to_markdown(page['text'], parser="lxml")
-   print(result)
+def source_hash(html, parser):
+    """Hash of everything the Markdown of a page depends on"""
+    source = json.dumps([MARKDOWN_VERSION, parser, html], ensure_ascii=False)
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+def convert_page(job):
+    """Pool task: (name, hash, html, parser) -> (name, hash, markdown)"""
+    name, key, html, parser = job
+    return name, key, convert_to_markdown(html, parser=parser).strip() + "\n"
+
+def write_atomic(path, content):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def load_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the HTML transcriptions to per-poem Markdown files and a combined book")
+    parser.add_argument("input", nargs="?", default="Qari_ocr_output.json",
+                        help="poems with HTML text (default Qari_ocr_output.json)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help=f"per-poem .md files (default {OUTPUT_DIR})")
+    parser.add_argument("--book", default=BOOK_PATH, help=f"combined Markdown book (default {BOOK_PATH})")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="conversion processes (default: one per core)")
+    parser.add_argument("--parser", default="lxml", help="HTML parser for html_to_markdown (default lxml)")
+    parser.add_argument("--force", action="store_true", help="convert every poem, even unchanged ones")
+    args = parser.parse_args()
+    started = time.perf_counter()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = os.path.join(args.output_dir, MANIFEST_NAME)
+    manifest = {} if args.force else load_manifest(manifest_path)
+
+    # Poems in book order (only their names are kept); a poem is converted only if its HTML
+    # changed or its .md is missing, and the HTML is read from the input as it is needed
+    names = []
+    used = set()
+
+    def changed_jobs():
+        for i, page in enumerate(PoemReader(args.input)):
+            name = poem_name(page, i, used)
+            names.append(name)
+            key = source_hash(page["text"], args.parser)
+            if manifest.get(name) != key or not os.path.exists(os.path.join(args.output_dir, name + ".md")):
+                yield name, key, page["text"], args.parser
+
+    def save(result):
+        name, key, markdown = result
+        write_atomic(os.path.join(args.output_dir, name + ".md"), markdown)
+        manifest[name] = key
+
+    # Conversion is CPU-bound and independent per poem, so it spreads over a process pool. At most
+    # WINDOW tasks per process are in flight, and each result is written as soon as it is collected,
+    # so memory holds a few poems however many changed.
+    converted = 0
+    pool = None
+    pending = deque()
+    try:
+        for job in changed_jobs():
+            converted += 1
+            if args.processes <= 1:
+                save(convert_page(job))
+                continue
+            if pool is None:
+                pool = multiprocessing.Pool(args.processes)
+            pending.append(pool.apply_async(convert_page, (job,)))
+            if len(pending) >= args.processes * WINDOW:
+                save(pending.popleft().get())
+        while pending:
+            save(pending.popleft().get())
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    # Poems that are gone lose their files
+    for filename in os.listdir(args.output_dir):
+        if filename.endswith(".md") and filename[:-3] not in used:
+            os.remove(os.path.join(args.output_dir, filename))
+    manifest = {name: key for name, key in manifest.items() if name in used}
+    write_atomic(manifest_path, json.dumps(manifest, indent=2))
+
+    # --- Combined book, streamed from the per-poem files ---
+    tmp_path = f"{args.book}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as book:
+        for index, name in enumerate(names):
+            if index:
+                book.write("\n")
+            with open(os.path.join(args.output_dir, name + ".md"), "r", encoding="utf-8") as f:
+                book.write(f.read())
+    os.replace(tmp_path, args.book)
+
+    print(f"Converted {converted} of {len(names)} poems ({len(names) - converted} unchanged) "
+          f"with {args.processes if pool is not None else 1} processes in {time.perf_counter() - started:.1f}s")
+    print(f"Markdown written to {args.output_dir}/ and {args.book}")
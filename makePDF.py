@@ -2,7 +2,25 @@ import json
 from fpdf import FPDF
 import unicodedata
 import os
+import io
+import time
+import hashlib
+import importlib.util
+import argparse
 from PIL import Image
+from ocr_cache import file_digest
+from poem_reader import PoemReader
+
+# Scans are embedded as recompressed JPEGs at this resolution for their printed size,
+# kept in IMAGE_CACHE_DIR between builds (keyed by source hash and these settings)
+IMAGE_CACHE_DIR = "pdf_image_cache"
+EMBED_DPI = 150
+JPEG_QUALITY = 80
+
+# Poems are rendered one by one into FRAGMENT_DIR and merged, so an edit re-renders only its poem.
+# Bump LAYOUT_VERSION when render_poem() changes so every fragment is rebuilt.
+FRAGMENT_DIR = "pdf_fragments"
+LAYOUT_VERSION = 1
 
 def clean_text(text):
     return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
@@ -34,6 +52,30 @@ def write_centered_multiline(pdf: FPDF, text: str, font_size=12):
             # Handle blank lines
             pdf.ln(line_height)
 
+def derived_image(image_path, width_mm, height_mm, dpi=EMBED_DPI, quality=JPEG_QUALITY, cache_dir=IMAGE_CACHE_DIR):
+    """Path of a JPEG of image_path sized for width_mm x height_mm at dpi, made once and reused.
+
+    The cached file is named after the source's SHA-256 and the output
+    settings, so an edited scan or a new DPI/quality gets a fresh file.
+    Scans are only ever scaled down.
+    """
+    target = (max(1, round(width_mm / 25.4 * dpi)), max(1, round(height_mm / 25.4 * dpi)))
+    cache_path = os.path.join(cache_dir, f"{file_digest(image_path)}-{target[0]}x{target[1]}-q{quality}.jpg")
+    if os.path.exists(cache_path):
+        return cache_path
+
+    with Image.open(image_path) as img:
+        img.draft("RGB", target)  # Let libjpeg decode JPEG scans at a reduced scale
+        derived = img.convert("RGB")
+    if derived.width > target[0] or derived.height > target[1]:
+        derived = derived.resize(target, Image.LANCZOS)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    derived.save(tmp_path, "JPEG", quality=quality, optimize=True)
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
 def add_image_to_pdf(pdf, image_path, max_width=180, max_height=240):
     """Add an image to the PDF, scaling it to fit within the specified dimensions"""
     if not os.path.exists(image_path):
@@ -63,8 +105,8 @@ def add_image_to_pdf(pdf, image_path, max_width=180, max_height=240):
             pdf.add_page()
             y_pos = pdf.t_margin
         
-        # Add the image
-        pdf.image(image_path, x=x_pos, y=y_pos, w=final_width, h=final_height)
+        # Add the image (a cached copy downsampled for its printed size)
+        pdf.image(derived_image(image_path, final_width, final_height, EMBED_DPI, JPEG_QUALITY), x=x_pos, y=y_pos, w=final_width, h=final_height)
         
         # Move cursor below the image
         pdf.set_y(y_pos + final_height + 10)
@@ -74,47 +116,40 @@ def add_image_to_pdf(pdf, image_path, max_width=180, max_height=240):
         print(f"Error adding image {image_path}: {e}")
         return False
 
-# Load saved OCR results
-with open("ocr_output.json", "r", encoding="utf-8") as f:
-    pages = json.load(f)
-
-# Sort poems by lowest filename number
-def get_lowest_filename_number(poem):
-    """Extract the lowest number from the poem's filenames"""
-    filenames = poem.get("pages", [poem.get("filename", "999.jpg")])
-    numbers = []
-    for filename in filenames:
-        # Extract number from filename (e.g., "07.JPG" -> 7)
-        import re
-        match = re.search(r'(\d+)', filename)
-        if match:
-            numbers.append(int(match.group(1)))
-    return min(numbers) if numbers else 999
-
-pages.sort(key=get_lowest_filename_number)
-
-# Create single PDF with everything
-pdf = FPDF()
-pdf.set_auto_page_break(auto=True, margin=20)
-
-# --- Table of Contents Page ---
-pdf.add_page()
-pdf.set_font("Arial", "B", 16)
-pdf.cell(0, 10, "Table of Contents", ln=True, align="C")
-pdf.ln(5)
-pdf.set_font("Arial", size=12)
-
-toc_entries = []
-toc_y_positions = []
-
-# Reserve lines in TOC (we'll fill in the page numbers later)
-for page in pages:
-    toc_y_positions.append(pdf.get_y())
-    cleaned_title = clean_text(page["title"])
-    pdf.cell(0, 10, f"{cleaned_title} ........................................", ln=True)
+parser = argparse.ArgumentParser(description="Build juniors_poems.pdf from ocr_output.json and the scans in img/")
+parser.add_argument("--input", default="ocr_output.json",
+                    help="poems to typeset: the JSON written by ocr.py, one poem per line in a .jsonl, or an ocr_store.py .db")
+parser.add_argument("--dpi", type=int, default=EMBED_DPI,
+                    help=f"resolution of embedded scans at their printed size (default {EMBED_DPI})")
+parser.add_argument("--jpeg-quality", type=int, default=JPEG_QUALITY,
+                    help=f"JPEG quality of embedded scans (default {JPEG_QUALITY})")
+parser.add_argument("--full", action="store_true",
+                    help="lay out the whole book in one pass instead of merging cached per-poem fragments")
+args = parser.parse_args()
+EMBED_DPI = args.dpi
+JPEG_QUALITY = args.jpeg_quality
+build_started = time.perf_counter()
+
+# Saved OCR results, read one poem at a time in lowest-filename-number order
+pages = PoemReader(args.input)
 
-# --- Poem Pages ---
-for i, page in enumerate(pages):
+def poem_image_files(page):
+    """Scans that belong to a poem, in page order"""
+    if "pages" in page and page["pages"]:
+        # Multiple pages case
+        return page["pages"]
+    elif "filename" in page:
+        # Single page case
+        return [page["filename"]]
+    return []
+
+def new_pdf():
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=20)
+    return pdf
+
+def render_poem(pdf, page):
+    """Lay out one poem (title, centered text, then its scans) from a new page; returns its first page number"""
     pdf.add_page()
     current_page = pdf.page_no()
 
@@ -130,22 +165,9 @@ for i, page in enumerate(pages):
     
     # Poem body centered
     write_centered_multiline(pdf, page["text"])
-
-    # Record for TOC (use current page number, not the calculated one)
-    toc_entries.append((cleaned_title, current_page))
     
-    # Add scanned images after the poem text
-    # Get list of image files for this poem
-    image_files = []
-    if "pages" in page and page["pages"]:
-        # Multiple pages case
-        image_files = page["pages"]
-    elif "filename" in page:
-        # Single page case
-        image_files = [page["filename"]]
-    
-    # Add each scanned image
-    for image_file in image_files:
+    # Add each scanned image after the poem text
+    for image_file in poem_image_files(page):
         if image_file:  # Make sure filename is not empty
             # Add some space before the image
             pdf.ln(15)
@@ -170,24 +192,136 @@ for i, page in enumerate(pages):
                 pdf.set_x((pdf.w - error_width) / 2)
                 pdf.cell(0, 10, error_text, ln=True, align="C")
                 pdf.ln(10)
+    return current_page
+
+def fragment_key(page):
+    """Hash of everything that shapes a poem's pages: its text, its scans (by size and mtime) and the layout settings"""
+    scans = []
+    for image_file in poem_image_files(page):
+        image_path = os.path.join("img", image_file)
+        if image_file and os.path.exists(image_path):
+            stat = os.stat(image_path)
+            scans.append([image_file, stat.st_size, stat.st_mtime_ns])
+        else:
+            scans.append([image_file, None])
+    source = json.dumps([LAYOUT_VERSION, EMBED_DPI, JPEG_QUALITY, page["title"], page["text"], scans],
+                        ensure_ascii=False)
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+def render_toc(entries):
+    """Table of contents as its own PDF (bytes) for [(title, first page number)]"""
+    pdf = new_pdf()
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, "Table of Contents", ln=True, align="C")
+    pdf.ln(5)
+    pdf.set_font("Arial", size=12)
+    for title, page_num in entries:
+        dots = "." * max(1, 70 - len(title))  # Ensure at least one dot
+        pdf.cell(0, 10, f"{title} {dots} {page_num}", ln=True)
+    return bytes(pdf.output())
+
+def build_incremental(pages, output):
+    """Build the book from per-poem fragments, re-rendering only poems whose fragment key changed.
+
+    Each poem is rendered on its own into FRAGMENT_DIR/<key>.pdf. The book is
+    the table of contents (always regenerated, it's one cheap text page or
+    so) followed by the fragments, merged with pypdf.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    os.makedirs(FRAGMENT_DIR, exist_ok=True)
+    fragments = []
+    rebuilt = 0
+    for page in pages:
+        fragment_path = os.path.join(FRAGMENT_DIR, fragment_key(page) + ".pdf")
+        if not os.path.exists(fragment_path):
+            pdf = new_pdf()
+            render_poem(pdf, page)
+            tmp_path = f"{fragment_path}.{os.getpid()}.tmp"
+            pdf.output(tmp_path)
+            os.replace(tmp_path, fragment_path)
+            rebuilt += 1
+        # Only the page count is kept; the fragment itself is opened again when merging
+        fragments.append((clean_text(page["title"]), fragment_path, len(PdfReader(fragment_path).pages)))
+
+    # Lay the TOC out once to learn how many pages it takes, then again with the real page numbers
+    toc_pages = len(PdfReader(io.BytesIO(render_toc([(title, 0) for title, _, _ in fragments]))).pages)
+    toc_entries = []
+    next_page = toc_pages + 1
+    for title, _, page_count in fragments:
+        toc_entries.append((title, next_page))
+        next_page += page_count
+
+    writer = PdfWriter()
+    writer.append(PdfReader(io.BytesIO(render_toc(toc_entries))))
+    for _, fragment_path, _ in fragments:
+        writer.append(fragment_path)
+    with open(output, "wb") as f:
+        writer.write(f)
+
+    # Fragments of poems that changed or disappeared are not needed any more
+    used = {os.path.basename(fragment_path) for _, fragment_path, _ in fragments}
+    for name in os.listdir(FRAGMENT_DIR):
+        if name.endswith(".pdf") and name not in used:
+            os.remove(os.path.join(FRAGMENT_DIR, name))
+    print(f"Re-rendered {rebuilt} of {len(fragments)} poems, reused the rest from {FRAGMENT_DIR}/")
+
+def build_full(pages, output):
+    """Build the whole book in one FPDF document (no pypdf needed)"""
+    # Create single PDF with everything
+    pdf = new_pdf()
+
+    # --- Table of Contents Page ---
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, "Table of Contents", ln=True, align="C")
+    pdf.ln(5)
+    pdf.set_font("Arial", size=12)
+
+    toc_entries = []
+    toc_y_positions = []
+
+    # Reserve lines in TOC (we'll fill in the page numbers later)
+    for page in pages:
+        toc_y_positions.append(pdf.get_y())
+        cleaned_title = clean_text(page["title"])
+        pdf.cell(0, 10, f"{cleaned_title} ........................................", ln=True)
+
+    # --- Poem Pages ---
+    for page in pages:
+        # Record for TOC (use current page number, not the calculated one)
+        toc_entries.append((clean_text(page["title"]), render_poem(pdf, page)))
+
+    # --- Finalize TOC (return to page 1) ---
+    # Save current state
+    current_page_num = pdf.page_no()
+    current_y = pdf.get_y()
 
-# --- Finalize TOC (return to page 1) ---
-# Save current state
-current_page_num = pdf.page_no()
-current_y = pdf.get_y()
+    # Go to TOC page
+    pdf.page = 1
+    pdf.set_font("Arial", size=12)
+    for (title, page_num), y in zip(toc_entries, toc_y_positions):
+        pdf.set_xy(10, y)
+        dots = "." * max(1, 70 - len(title))  # Ensure at least one dot
+        pdf.cell(0, 10, f"{title} {dots} {page_num}")
 
-# Go to TOC page
-pdf.page = 1
-pdf.set_font("Arial", size=12)
-for (title, page_num), y in zip(toc_entries, toc_y_positions):
-    pdf.set_xy(10, y)
-    dots = "." * max(1, 70 - len(title))  # Ensure at least one dot
-    pdf.cell(0, 10, f"{title} {dots} {page_num}")
+    # Restore state - this prevents extra blank pages
+    pdf.page = current_page_num
+    pdf.set_y(current_y)
 
-# Restore state - this prevents extra blank pages
-pdf.page = current_page_num
-pdf.set_y(current_y)
+    pdf.output(output)
 
 # --- Output ---
-pdf.output("juniors_poems.pdf")
-print("PDF generated successfully with scanned images!")
\ No newline at end of file
+output = "juniors_poems.pdf"
+if args.full:
+    build_full(pages, output)
+else:
+    if importlib.util.find_spec("pypdf") is None:  # Optional: only the incremental build needs it
+        print("pypdf is not installed (pip install pypdf), building the whole book in one pass")
+        build_full(pages, output)
+    else:
+        build_incremental(pages, output)
+print("PDF generated successfully with scanned images!")
+print(f"Built in {time.perf_counter() - build_started:.1f}s, "
+      f"{os.path.getsize(output) / (1024 * 1024):.1f} MB")
@@ -1,31 +1,36 @@
-import json
 import unicodedata
 import os
+import filecmp
 import re
+import argparse
+from poem_reader import PoemReader, poem_name
+
+# LaTeX special characters and their escapes
+LATEX_SPECIAL_CHARS = {
+    '&': r'\&',
+    '%': r'\%',
+    '$': r'\$',
+    '#': r'\#',
+    '^': r'\textasciicircum{}',
+    '_': r'\_',
+    '{': r'\{',
+    '}': r'\}',
+    '~': r'\textasciitilde{}',
+    '\\': r'\textbackslash{}'
+}
+LATEX_SPECIAL_PATTERN = re.compile("|".join(re.escape(char) for char in LATEX_SPECIAL_CHARS))
+
+# Per-poem \include files (--includes) go here, one per poem, named after its first scan
+INCLUDE_DIR = "poems_tex"
 
 def clean_text_for_latex(text):
     """Clean text and escape LaTeX special characters"""
     # First normalize unicode
     text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
     
-    # Escape LaTeX special characters
-    latex_special_chars = {
-        '&': r'\&',
-        '%': r'\%',
-        '$': r'\$',
-        '#': r'\#',
-        '^': r'\textasciicircum{}',
-        '_': r'\_',
-        '{': r'\{',
-        '}': r'\}',
-        '~': r'\textasciitilde{}',
-        '\\': r'\textbackslash{}'
-    }
-    
-    for char, replacement in latex_special_chars.items():
-        text = text.replace(char, replacement)
-    
-    return text
+    # Escape every special character in one pass, so the braces of \textbackslash{}
+    # (or the backslash of \&) are never escaped a second time
+    return LATEX_SPECIAL_PATTERN.sub(lambda match: LATEX_SPECIAL_CHARS[match.group()], text)
 
 def find_longest_line(text):
     """Find the longest line in the poem for verse centering"""
@@ -62,9 +67,8 @@ def format_poem_text_simple(text):
     
     return '\n'.join(formatted_lines)
 
-def generate_advanced_latex_document(pages):
-    """Generate LaTeX document with advanced poetry formatting"""
-    
+def latex_preamble():
+    """Preamble, title page and table of contents: every line before the first poem"""
     latex_content = []
     
     # Document header with memoir class and reliable poetry packages
@@ -135,62 +139,130 @@ def generate_advanced_latex_document(pages):
         r'\newpage',
         ''
     ])
+    return latex_content
+
+def poem_latex(page, i):
+    """Lines of one poem (title, verse, trailing space), without the page break that follows it"""
+    latex_content = []
+
+    # Handle different data structures
+    if isinstance(page, dict):
+        cleaned_title = clean_text_for_latex(page.get("title", f"Poem {i+1}"))
+        poem_text = page.get("text", "")
+    else:
+        print(f"Warning: Unexpected page format at index {i}: {type(page)}")
+        cleaned_title = f"Poem {i+1}"
+        poem_text = str(page) if page else ""
     
-    # Generate poems with advanced formatting
-    for i, page in enumerate(pages):
-        # Handle different data structures
-        if isinstance(page, dict):
-            cleaned_title = clean_text_for_latex(page.get("title", f"Poem {i+1}"))
-            poem_text = page.get("text", "")
-        else:
-            print(f"Warning: Unexpected page format at index {i}: {type(page)}")
-            cleaned_title = f"Poem {i+1}"
-            poem_text = str(page) if page else ""
+    # Add poem to document - use poemtitle and poemtoc from verse package
+    latex_content.append(f'% === Poem {i+1}: {cleaned_title} ===')
+    
+    # Format poem text with proper centering
+    if poem_text.strip():
+        # Find longest line for centering
+        longest_line = find_longest_line(poem_text)
+        formatted_text = format_poem_text_simple(poem_text)
         
-        # Add poem to document - use poemtitle and poemtoc from verse package
-        latex_content.append(f'% === Poem {i+1}: {cleaned_title} ===')
+        # Set verse width and add poem title
+        latex_content.append(f'\\settowidth{{\\versewidth}}{{{longest_line}}}')
+        latex_content.append(r'\addtolength{\versewidth}{4em}')
+        latex_content.append(f'\\poemtitle{{{cleaned_title}}}')
+        latex_content.append('')
         
-        # Format poem text with proper centering
-        if poem_text.strip():
-            # Find longest line for centering
-            longest_line = find_longest_line(poem_text)
-            formatted_text = format_poem_text_simple(poem_text)
-            
-            # Set verse width and add poem title
-            latex_content.append(f'\\settowidth{{\\versewidth}}{{{longest_line}}}')
-            latex_content.append(r'\addtolength{\versewidth}{4em}')
-            latex_content.append(f'\\poemtitle{{{cleaned_title}}}')
-            latex_content.append('')
-            
-            # Use verse with proper width
-            latex_content.append(r'\begin{verse}[\versewidth]')
-            latex_content.append(r'\fontsize{19}{21}\selectfont')  # 18pt font, 22pt line spacing
-            latex_content.append(formatted_text)
-            latex_content.append(r'\end{verse}')
-            
-            latex_content.append('')
+        # Use verse with proper width
+        latex_content.append(r'\begin{verse}[\versewidth]')
+        latex_content.append(r'\fontsize{19}{21}\selectfont')  # 18pt font, 22pt line spacing
+        latex_content.append(formatted_text)
+        latex_content.append(r'\end{verse}')
         
-        # Add spacing
-        latex_content.append(r'\vspace{2cm}')
         latex_content.append('')
-        
-        # Page break between poems (except last)
-        if i < len(pages) - 1:
-            latex_content.extend([r'\newpage', ''])
     
+    # Add spacing
+    latex_content.append(r'\vspace{2cm}')
+    latex_content.append('')
+    return latex_content
+
+def generate_advanced_latex_document(pages):
+    """Lines of the LaTeX document with advanced poetry formatting, one poem at a time"""
+    yield from latex_preamble()
+
+    # Generate poems with advanced formatting
+    for i, page in enumerate(pages):
+        # Page break between poems
+        if i:
+            yield from [r'\newpage', '']
+        yield from poem_latex(page, i)
+
     # End document
-    latex_content.append(r'\end{document}')
-    
-    return '\n'.join(latex_content)
+    yield r'\end{document}'
+
+def write_if_changed(path, lines):
+    """Write lines (joined by newlines) to path unless the file already holds exactly that; returns True if it was written.
+
+    The lines are streamed to a temporary file that is then compared with the
+    existing one, so the document is never held in memory. Unchanged files keep
+    their timestamps, so latexmk (and \\includeonly) only redo the poems that
+    actually changed.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for i, line in enumerate(lines):
+            if i:
+                f.write("\n")
+            f.write(line)
+    if os.path.exists(path) and filecmp.cmp(tmp_path, path, shallow=False):
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    return True
+
+def write_latex_includes(pages, main_path, include_dir=INCLUDE_DIR):
+    """Write one \\include file per poem plus a main file that includes them, touching only changed files.
+
+    Returns (files written, files unchanged). Include files of poems that are
+    gone are removed.
+    """
+    os.makedirs(include_dir, exist_ok=True)
+    written = unchanged = 0
+    includes = []
+    used = set()
+    for i, page in enumerate(pages):
+        name = poem_name(page, i, used)
+        # The poem's position isn't written into the file, so inserting a poem leaves the others untouched
+        lines = poem_latex(page, i)[1:] + ['']
+        if write_if_changed(os.path.join(include_dir, name + ".tex"), lines):
+            written += 1
+        else:
+            unchanged += 1
+        includes.append(f'\\include{{{include_dir}/{name}}}')  # \include starts each poem on a new page
+
+    if write_if_changed(main_path, latex_preamble() + includes + ['', r'\end{document}']):
+        written += 1
+    else:
+        unchanged += 1
+
+    for filename in os.listdir(include_dir):
+        if filename.endswith(".tex") and filename[:-4] not in used:
+            os.remove(os.path.join(include_dir, filename))
+    return written, unchanged
 
 # Main execution
 if __name__ == "__main__":
-    # Load saved OCR results
-    try:
-        with open("ocr_output.json", "r", encoding="utf-8") as f:
-            pages = json.load(f)
-    except FileNotFoundError:
-        print("Error: ocr_output.json not found. Creating sample data for testing.")
+    parser = argparse.ArgumentParser(description="Build the LaTeX book from ocr_output.json")
+    parser.add_argument("--input", default="ocr_output.json",
+                        help="poems to typeset: the JSON written by ocr.py, one poem per line in a .jsonl, or an ocr_store.py .db")
+    parser.add_argument("--output", default="juniors_poems_advanced.tex")
+    parser.add_argument("--includes", action="store_true",
+                        help="write one \\include file per poem so latexmk/\\includeonly only rebuild changed poems")
+    parser.add_argument("--include-dir", default=INCLUDE_DIR,
+                        help=f"folder for the per-poem files (default {INCLUDE_DIR})")
+    args = parser.parse_args()
+
+    # Saved OCR results, read one poem at a time in lowest-filename-number order
+    if os.path.exists(args.input):
+        pages = PoemReader(args.input)
+    else:
+        print(f"Error: {args.input} not found. Creating sample data for testing.")
         pages = [
             {
                 "title": "Sample Poem",
@@ -201,35 +273,19 @@ if __name__ == "__main__":
     
     # Debug info
     print("Data structure check:")
-    print(f"Type of pages: {type(pages)}")
-    if pages:
-        print(f"Type of first item: {type(pages[0])}")
-        print(f"First item preview: {str(pages[0])[:200]}...")
+    print(f"Number of poems: {len(pages)}")
+    first = next(iter(pages), None)
+    if first is not None:
+        print(f"Type of first item: {type(first)}")
+        print(f"First item preview: {str(first)[:200]}...")
     
-    # Sort poems by filename number
-    def get_lowest_filename_number(poem):
-        if isinstance(poem, dict):
-            filenames = poem.get("pages", [poem.get("filename", "999.jpg")])
-        elif isinstance(poem, list):
-            filenames = poem if poem else ["999.jpg"]
+    if args.includes:
+        written, unchanged = write_latex_includes(pages, args.output, args.include_dir)
+        print(f"Advanced LaTeX file generated: {args.output} with {len(pages)} poems in {args.include_dir}/ "
+              f"({written} files rewritten, {unchanged} unchanged)")
+    else:
+        # Write main file, streamed poem by poem (left alone if nothing changed, so latexmk has nothing to do)
+        if write_if_changed(args.output, generate_advanced_latex_document(pages)):
+            print(f"Advanced LaTeX file generated: {args.output}")
         else:
-            return 999
-        
-        numbers = []
-        for filename in filenames:
-            if isinstance(filename, str):
-                match = re.search(r'(\d+)', filename)
-                if match:
-                    numbers.append(int(match.group(1)))
-        return min(numbers) if numbers else 999
-    
-    pages.sort(key=get_lowest_filename_number)
-    
-    # Generate main LaTeX document
-    latex_document = generate_advanced_latex_document(pages)
-    
-    # Write main file
-    with open("juniors_poems_advanced.tex", "w", encoding="utf-8") as f:
-        f.write(latex_document)
-    
-    print("Advanced LaTeX file generated: juniors_poems_advanced.tex")
\ No newline at end of file
+            print(f"{args.output} is already up to date")
\ No newline at end of file
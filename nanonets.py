@@ -1,38 +1,50 @@
-import torch
-from transformers import Qwen2VLForConditionalGeneration, AutoProcessor
 from PIL import Image
+import ocr_worker
+
+MODEL_ID = "Qwen/Qwen2-VL-2B-Instruct"
+IMAGE_PATH = "img/03.jpg"
+PROMPT = "Read all the text in this image."
+
+# Use a warm ocr_worker.py if one is running; only load the model here otherwise
+worker = ocr_worker.connect()
+if worker:
+    output = worker.ocr([IMAGE_PATH], PROMPT, MODEL_ID, 512)[0]
+    worker.close()
+else:
+    from transformers import Qwen2VLForConditionalGeneration, AutoProcessor
+
+    # Load model and processor
+    model = Qwen2VLForConditionalGeneration.from_pretrained(
+        MODEL_ID,
+        torch_dtype="auto",
+        device_map="auto"
+    )
+    processor = AutoProcessor.from_pretrained(MODEL_ID)
+
+    # Load the image
+    image = Image.open(IMAGE_PATH)
+
+    # Simple OCR prompt
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "image", "image": image},
+                {"type": "text", "text": PROMPT}
+            ]
+        }
+    ]
+
+    # Build prompt
+    prompt = processor.apply_chat_template(messages, add_generation_prompt=True)
+
+    # Process inputs
+    inputs = processor(prompt, return_tensors="pt").to(model.device)
+
+    # Generate output
+    generated_ids = model.generate(**inputs, max_new_tokens=512)
+
+    # Decode
+    output = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
 
-# Load model and processor
-model = Qwen2VLForConditionalGeneration.from_pretrained(
-    "Qwen/Qwen2-VL-2B-Instruct",
-    torch_dtype="auto",
-    device_map="auto"
-)
-processor = AutoProcessor.from_pretrained("Qwen/Qwen2-VL-2B-Instruct")
-
-# Load the image
-image = Image.open("img/03.jpg")
-
-# Simple OCR prompt
-messages = [
-    {
-        "role": "user",
-        "content": [
-            {"type": "image", "image": image},
-            {"type": "text", "text": "Read all the text in this image."}
-        ]
-    }
-]
-
-# Build prompt
-prompt = processor.apply_chat_template(messages, add_generation_prompt=True)
-
-# Process inputs
-inputs = processor(prompt, return_tensors="pt").to(model.device)
-
-# Generate output
-generated_ids = model.generate(**inputs, max_new_tokens=512)
-
-# Decode and print
-output = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
 print(output)
@@ -1,79 +1,116 @@
 import os
 import json
 from PIL import Image
-from transformers import Qwen2VLForConditionalGeneration, AutoProcessor
-import torch
-from qwen_vl_utils import process_vision_info
+from ocr_cache import OCRCache, file_digest
+import ocr_worker
 
-# Load model & processor
+# Load model & processor (on first use, so cached runs skip it)
 model_name = "NAMAA-Space/Qari-OCR-v0.3-VL-2B-Instruct"
-model = Qwen2VLForConditionalGeneration.from_pretrained(
-    model_name,
-    torch_dtype="auto",
-    device_map="auto"
-)
-processor = AutoProcessor.from_pretrained(model_name)
+MAX_NEW_TOKENS = 2000
+model = None
+processor = None
+
+def load_model():
+    """Load the Qari model and processor once"""
+    global model, processor
+    if model is None:
+        # Imported here so runs served by a worker or the cache never pull in torch/transformers
+        from transformers import Qwen2VLForConditionalGeneration, AutoProcessor
+
+        model = Qwen2VLForConditionalGeneration.from_pretrained(
+            model_name,
+            torch_dtype="auto",
+            device_map="auto"
+        )
+        processor = AutoProcessor.from_pretrained(model_name)
+        # Pad on the left so the title and body prompts of a page can share one generate call
+        processor.tokenizer.padding_side = "left"
+    return processor, model
 
 # OCR function
-def ocr_image(image, prompt_text, temp_filename="temp_image.png"):
-    # Save image temporarily
-    image.save(temp_filename)
-    
-    messages = [
-        {
+def ocr_requests(requests):
+    """Run several (image, prompt) requests as one padded generate call, one text per request.
+
+    PIL images go straight to the processor, so nothing is written to disk.
+    """
+    load_model()
+    texts = [
+        processor.apply_chat_template([{
             "role": "user",
-            "content": [
-                {"type": "image", "image": f"file://{temp_filename}"},
-                {"type": "text", "text": prompt_text},
-            ],
-        }
+            "content": [{"type": "image"}, {"type": "text", "text": prompt_text}]
+        }], tokenize=False, add_generation_prompt=True)
+        for _, prompt_text in requests
     ]
-    
-    text = processor.apply_chat_template(
-        messages, tokenize=False, add_generation_prompt=True
-    )
-    image_inputs, video_inputs = process_vision_info(messages)
     inputs = processor(
-        text=[text],
-        images=image_inputs,
-        videos=video_inputs,
+        text=texts,
+        images=[image for image, _ in requests],
         padding=True,
         return_tensors="pt",
-    )
-    inputs = inputs.to("cuda" if torch.cuda.is_available() else "cpu")
-    
-    generated_ids = model.generate(**inputs, max_new_tokens=2000)
-    generated_ids_trimmed = [
-        out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
-    ]
-    output_text = processor.batch_decode(
+    ).to(model.device)
+
+    generated_ids = model.generate(**inputs, max_new_tokens=MAX_NEW_TOKENS)
+    # Prompts are left-padded to one length, so the new tokens start at the same column
+    generated_ids_trimmed = generated_ids[:, inputs.input_ids.shape[1]:]
+    output_texts = processor.batch_decode(
         generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
-    )[0]
-    
-    # Clean up temp file
-    os.remove(temp_filename)
-    
-    return output_text.strip()
+    )
+    return [text.strip() for text in output_texts]
+
+def ocr_image(image, prompt_text):
+    return ocr_requests([(image, prompt_text)])[0]
 
 # Process all images
 image_folder = "img"
 ocr_results = []
 
+# Skip the model for pages whose image, prompt and settings are already cached
+cache = OCRCache()
+title_settings = {"max_new_tokens": MAX_NEW_TOKENS, "crop": "top 20%"}
+poem_settings = {"max_new_tokens": MAX_NEW_TOKENS}
+
+# Send pages to a warm ocr_worker.py if one is running instead of loading the model here
+worker = ocr_worker.connect()
+if worker:
+    print(f"Using OCR worker at {worker.address}")
+
+title_prompt = "Extract only the title of this poem. Return just the title text with no additional commentary."
+poem_prompt = "Below is the image of one page of a document. Return the plain text representation of this document as if you were reading it naturally, preserving the original formatting and line breaks. Do not hallucinate or add extra content."
+
 for filename in sorted(os.listdir(image_folder)):
     if filename.lower().endswith((".jpg", ".jpeg", ".png")):
         path = os.path.join(image_folder, filename)
-        img = Image.open(path)
-        width, height = img.size
+        digest = file_digest(path)
+        title = cache.get(digest, model_name, title_prompt, title_settings)
+        poem_text = cache.get(digest, model_name, poem_prompt, poem_settings)
 
-        # Crop top 20% for title
-        title_img = img.crop((0, 0, width, int(height * 0.2)))
-        title_prompt = "Extract only the title of this poem. Return just the title text with no additional commentary."
-        title = ocr_image(title_img, title_prompt, f"temp_title_{filename}")
-        title = title.split("\n")[0].strip().title()
+        if title is None or poem_text is None:
+            with Image.open(path) as img:
+                width, height = img.size
+            # Crop top 20% for title
+            title_box = (0, 0, width, int(height * 0.2))
 
-        # Full OCR with formatting preservation
-        poem_prompt = "Below is the image of one page of a document. Return the plain text representation of this document as if you were reading it naturally, preserving the original formatting and line breaks. Do not hallucinate or add extra content."
-        poem_text = ocr_image(img, poem_prompt, f"temp_poem_{filename}")
+            if worker:
+                if title is None:
+                    title = worker.ocr([(path, title_box)], title_prompt, model_name, MAX_NEW_TOKENS)[0]
+                if poem_text is None:
+                    poem_text = worker.ocr([path], poem_prompt, model_name, MAX_NEW_TOKENS)[0]
+            else:
+                # Title crop and full page (with formatting preservation) share one batched generate
+                with Image.open(path) as img:
+                    img = img.convert("RGB")
+                requests = []
+                if title is None:
+                    requests.append((img.crop(title_box), title_prompt))
+                if poem_text is None:
+                    requests.append((img, poem_prompt))
+                outputs = ocr_requests(requests)
+                if title is None:
+                    title = outputs.pop(0)
+                if poem_text is None:
+                    poem_text = outputs.pop(0)
+            cache.put(digest, model_name, title_prompt, title_settings, title)
+            cache.put(digest, model_name, poem_prompt, poem_settings, poem_text)
+        title = title.split("\n")[0].strip().title()
 
         ocr_results.append({
             "filename": filename,
@@ -1,178 +1,440 @@
 import os
 import json
-from transformers import AutoProcessor, AutoModelForImageTextToText
-from PIL import Image
-import torch
-import re
+import argparse
+import time
+from itertools import islice
+from ocr_cache import OCRCache, file_digest
+import ocr_worker
+import ocr_pool
+from ocr_journal import PageJournal, read_journal, JOURNAL_PATH
+from page_images import fit_pixel_budget, load_page, prefetch
+from ocr_quantize import quantize_model, QUANTIZE_MODES
+import ocr_trace
+from ocr_rules import get_rules
+from assemble_poems import assemble, latest_pages
 
-# Load model & processor
-processor = AutoProcessor.from_pretrained("JackChew/Qwen2-VL-2B-OCR")
-model = AutoModelForImageTextToText.from_pretrained("JackChew/Qwen2-VL-2B-OCR").to(
-    torch.device("cuda" if torch.cuda.is_available() else "cpu")
-)
+MODEL_ID = "JackChew/Qwen2-VL-2B-OCR"
+OCR_PROMPT = "Transcribe all text from this document exactly as written, preserving line breaks and spacing."
+MAX_NEW_TOKENS = 2048
+
+# Dynamic int8 quantization for CPU inference (None for fp32, or one of
+# ocr_quantize.QUANTIZE_MODES)
+QUANTIZE = None
+
+# Models & processors are loaded on first use (keyed by model id and quantization),
+# so fully cached runs and worker clients never pay for it
+_loaded_models = {}
+
+def load_model(model_id=MODEL_ID, quantize=QUANTIZE):
+    """Load an OCR model and its processor once, returning (processor, model)"""
+    if (model_id, quantize) not in _loaded_models:
+        # Imported here so worker clients and fully cached runs never pull in torch/transformers
+        import torch
+        from transformers import AutoProcessor, AutoModelForImageTextToText
+        processor = AutoProcessor.from_pretrained(model_id)
+        model = AutoModelForImageTextToText.from_pretrained(model_id).to(
+            torch.device("cuda" if torch.cuda.is_available() and not quantize else "cpu")
+        )
+        if quantize:
+            quantize_model(model, quantize)
+        # Pad on the left so every prompt in a batch ends where generation starts
+        processor.tokenizer.padding_side = "left"
+        _loaded_models[(model_id, quantize)] = (processor, model)
+    return _loaded_models[(model_id, quantize)]
+
+# Pages per padded generate call (override with --batch-size)
+BATCH_SIZE = 4
+
+# Generation guardrails: cut off degenerate repeat loops, optionally cap wall time
+# per generate call (seconds, None for no limit)
+LOOP_GUARD = True
+TIME_BUDGET = None
+
+# Visual-token budget: pages are scaled to fit before the processor sees them
+# ({"max_pixels": ..., "min_pixels": ..., "long_edge": ...}; None keeps camera resolution)
+PIXEL_BUDGET = None
+
+# Background image loading: decoder threads and how many pages may be read ahead
+PREFETCH_WORKERS = 2
+PREFETCH_QUEUE = 8
 
 # OCR function
-def ocr_image(image, prompt_text):
+def ocr_pages(images, prompt_text, max_new_tokens=MAX_NEW_TOKENS, model_id=MODEL_ID,
+              loop_guard=LOOP_GUARD, time_budget=TIME_BUDGET, pixel_budget=PIXEL_BUDGET, quantize=QUANTIZE,
+              confidence=False):
+    """Run OCR on several images with one padded generate call.
+
+    Returns one {"text", "stop_reason"} dict per image. stop_reason is None when
+    the model finished on its own, otherwise "repetition", "time_budget" or
+    "max_new_tokens" to mark the page for reprocessing. While ocr_trace is
+    enabled each dict also has "stages" (seconds per stage) and "tokens"
+    (visual, text and generated token counts). With confidence=True each dict
+    also has "confidence" (the page's geometric-mean token probability) and
+    "lines" ({"text", "confidence"} per line, see ocr_confidence.py).
+    """
+    import torch
+    from transformers import StoppingCriteriaList, LogitsProcessorList
+    from ocr_stopping import RepetitionLoopCriteria, TimeBudgetCriteria, StepTimer
+    from ocr_confidence import TokenLogprobRecorder, score_tokens
+
+    processor, model = load_model(model_id, quantize)
+    tracer = ocr_trace.active()
+    stages = {}  # Seconds per stage for this batch, filled in only while tracing
+    if pixel_budget:
+        with ocr_trace.span("fit_pixel_budget", stages):
+            images = [fit_pixel_budget(image, **pixel_budget) for image in images]
     conversation = [{
         "role": "user",
         "content": [{"type": "image"}, {"type": "text", "text": prompt_text}]
     }]
-    prompt = processor.apply_chat_template(conversation, add_generation_prompt=True)
-    inputs = processor(text=[prompt], images=[image], padding=True, return_tensors="pt").to(model.device)
-    output_ids = model.generate(**inputs, max_new_tokens=2048)
-    generated_ids = [output_ids[len(input_ids):] for input_ids, output_ids in zip(inputs.input_ids, output_ids)]
-    return processor.batch_decode(generated_ids, skip_special_tokens=True)[0].strip()
+    with ocr_trace.span("apply_chat_template", stages):
+        prompt = processor.apply_chat_template(conversation, add_generation_prompt=True)
+    with ocr_trace.span("processor", stages, pages=len(images)):
+        inputs = processor(text=[prompt] * len(images), images=list(images), padding=True, return_tensors="pt").to(model.device)
+    prompt_length = inputs.input_ids.shape[1]
+
+    eos_token_ids = model.generation_config.eos_token_id
+    if not isinstance(eos_token_ids, list):
+        eos_token_ids = [eos_token_ids]
+    loop_criteria = RepetitionLoopCriteria(prompt_length, eos_token_ids) if loop_guard else None
+    time_criteria = TimeBudgetCriteria(time_budget) if time_budget else None
+    # While tracing, timestamp every generated token to split prefill from decode
+    step_timer = StepTimer() if tracer else None
+    stopping_criteria = StoppingCriteriaList(c for c in (loop_criteria, time_criteria, step_timer) if c is not None)
+
+    # Record the log-probability of every picked token for confidence scores
+    recorder = TokenLogprobRecorder() if confidence else None
+    logits_processor = LogitsProcessorList([recorder] if recorder else [])
+
+    generate_started = time.perf_counter()
+    output_ids = model.generate(**inputs, max_new_tokens=max_new_tokens, stopping_criteria=stopping_criteria,
+                                logits_processor=logits_processor)
+    generate_finished = time.perf_counter()
+    # All prompts share the padded length, so the new tokens start at the same column
+    generated_ids = output_ids[:, prompt_length:]
+    with ocr_trace.span("batch_decode", stages):
+        texts = processor.batch_decode(generated_ids, skip_special_tokens=True)
+
+    is_eos = torch.isin(generated_ids, torch.tensor(eos_token_ids, device=generated_ids.device))
+    finished = is_eos.any(dim=1)
+    if recorder:
+        token_logprobs = recorder.finish(output_ids)
+        # Generated text runs up to the first EOS; the rest of the row is padding
+        text_lengths = torch.where(finished, is_eos.int().argmax(dim=1),
+                                   torch.full_like(finished, generated_ids.shape[1], dtype=torch.long)).tolist()
+
+    if tracer:
+        first_token_at = step_timer.step_times[0] if step_timer.step_times else generate_finished
+        decode_steps = max(len(step_timer.step_times) - 1, 0)
+        tracer.add("prefill", generate_started, first_token_at, pages=len(images), prompt_tokens=prompt_length)
+        tracer.add("decode", first_token_at, generate_finished, pages=len(images), steps=decode_steps,
+                   ms_per_step=1000 * (generate_finished - first_token_at) / decode_steps if decode_steps else 0.0)
+        stages["prefill"] = first_token_at - generate_started
+        stages["decode"] = generate_finished - first_token_at
+
+        # Visual tokens: one per merge_size x merge_size block of vision patches
+        merge_size = getattr(processor.image_processor, "merge_size", 2)
+        visual_tokens = (inputs.image_grid_thw.prod(dim=1) // merge_size ** 2).tolist()
+        prompt_tokens = inputs.attention_mask.sum(dim=1).tolist()
+        # Generated tokens run up to and including the first EOS (the rest is padding)
+        generated_tokens = torch.where(finished, is_eos.int().argmax(dim=1) + 1,
+                                       torch.full_like(finished, generated_ids.shape[1], dtype=torch.long)).tolist()
+
+    results = []
+    for row, text in enumerate(texts):
+        if loop_criteria is not None and loop_criteria.looped is not None and loop_criteria.looped[row]:
+            stop_reason = "repetition"
+        elif finished[row]:
+            stop_reason = None
+        elif time_criteria is not None and time_criteria.expired:
+            stop_reason = "time_budget"
+        else:
+            stop_reason = "max_new_tokens"
+        result = {"text": text.strip(), "stop_reason": stop_reason}
+        if tracer:
+            # Batch-wide stages are charged to each page in equal shares
+            result["stages"] = {stage: seconds / len(images) for stage, seconds in stages.items()}
+            result["tokens"] = {
+                "visual": visual_tokens[row],
+                "text": prompt_tokens[row] - visual_tokens[row],
+                "generated": generated_tokens[row]
+            }
+        if recorder:
+            length = text_lengths[row]
+            result["confidence"], result["lines"] = score_tokens(processor.tokenizer, generated_ids[row, :length].tolist(),
+                                                                 token_logprobs[row, :length].tolist())
+        results.append(result)
+    return results
+
+def ocr_images(images, prompt_text, max_new_tokens=MAX_NEW_TOKENS, model_id=MODEL_ID):
+    """Run OCR on several images with one padded generate call, one text per image"""
+    return [result["text"] for result in ocr_pages(images, prompt_text, max_new_tokens, model_id)]
+
+def ocr_image(image, prompt_text, confidence=False):
+    """OCR one image; with confidence=True, return the full ocr_pages() dict (text plus confidence scores)"""
+    if confidence:
+        return ocr_pages([image], prompt_text, confidence=True)[0]
+    return ocr_images([image], prompt_text)[0]
 
 def extract_title_from_text(full_text, debug_filename=""):
-    """Extract title from full OCR text using smart heuristics"""
-    lines = [line.strip() for line in full_text.split('\n') if line.strip()]
-    
-    if debug_filename:
-        print(f"\nDebug - Analyzing {debug_filename}:")
-        for i, line in enumerate(lines[:10]):
-            print(f"  {i}: '{line}'")
-    
-    # Look for title in first several lines
-    for i, line in enumerate(lines[:10]):
-        # Skip page numbers and very short lines
-        if line.isdigit() or len(line) < 2:
-            continue
-            
-        # Skip common non-title elements
-        skip_phrases = [
-            "frederick thayer", "oakland", "maryland", "published", "forum",
-            "to a. s. d.", "your face", "word of god", "when i would"
-        ]
-        if any(phrase in line.lower() for phrase in skip_phrases):
-            continue
-            
-        # Check for continuation markers
-        if "(continued)" in line.lower() or "(cont" in line.lower():
-            continue
-            
-        # Skip parenthetical subtitles for now (we'll add them back later)
-        if line.startswith("(") and line.endswith(")"):
-            subtitle = line
-            continue
-            
-        # Look for title characteristics
-        is_likely_title = False
-        
-        # All caps or mostly caps (allowing for some lowercase)
-        if line.isupper() or (sum(1 for c in line if c.isupper()) > len(line) * 0.6):
-            is_likely_title = True
-            
-        # Title case and reasonable length
-        elif line.istitle() and 2 <= len(line) <= 40:
-            is_likely_title = True
-            
-        # Check if it's a short line that's not clearly poem content
-        elif (len(line.split()) <= 4 and 
-              not line.lower().startswith(("when", "the", "and", "but", "or", "in", "on", "at", "to", "from")) and
-              not any(char in line for char in ".,!?;:")):
-            is_likely_title = True
-            
-        if is_likely_title:
-            title = line.strip()
-            
-            # Check if next line is a subtitle in parentheses
-            if i + 1 < len(lines):
-                next_line = lines[i + 1].strip()
-                if next_line.startswith("(") and next_line.endswith(")"):
-                    title += f" {next_line}"
-                    
-            # Clean up spacing (fix OCR issues like "L E G E R D E M A I N")
-            if len(title.split()) > 3 and all(len(word) <= 2 for word in title.split() if word.isalpha()):
-                title = ''.join(title.split())
-                
-            if debug_filename:
-                print(f"  -> Found title: '{title}'")
-            return title
-    
-    if debug_filename:
-        print(f"  -> No title found, using 'Untitled'")
-    return "Untitled"
+    """Extract title from full OCR text using the shared rules (ocr_rules.json)"""
+    return get_rules().extract_title(full_text, debug_filename)
 
 def clean_poem_text(text, title):
     """Remove title and other metadata from poem text"""
-    lines = text.split('\n')
-    cleaned_lines = []
-    
-    # Remove title lines from the beginning
-    title_words = set(title.lower().replace('(', '').replace(')', '').split())
-    skip_count = 0
-    
-    for i, line in enumerate(lines):
-        line_words = set(line.lower().replace('(', '').replace(')', '').split())
-        
-        # Skip lines that are primarily the title
-        if i < 5 and title_words and len(title_words.intersection(line_words)) > len(title_words) * 0.6:
-            skip_count += 1
-            continue
-            
-        # Skip metadata lines
-        if any(phrase in line.lower() for phrase in ["frederick thayer", "oakland", "maryland", "published"]):
-            continue
-            
-        cleaned_lines.append(line)
-    
-    return '\n'.join(cleaned_lines).strip()
-
-# Process all images
-image_folder = "img"
-poems = {}  # Dictionary to group continuation pages
-
-for filename in sorted(os.listdir(image_folder)):
-    if filename.lower().endswith((".jpg", ".jpeg", ".png")):
-        path = os.path.join(image_folder, filename)
-        img = Image.open(path)
-        
-        print(f"\nProcessing {filename}...")
-        
-        # Full OCR with better prompt
-        poem_text = ocr_image(img, "Transcribe all text from this document exactly as written, preserving line breaks and spacing.")
-        
-        # Extract title using smart heuristics
-        title = extract_title_from_text(poem_text, filename)
-        
-        # Check if this is a continuation page
-        is_continuation = "(continued)" in poem_text.lower() or "(cont" in poem_text.lower()
-        
-        if is_continuation and poems:
-            # Find the most recent poem to continue
-            last_poem_key = list(poems.keys())[-1]
-            poems[last_poem_key]["text"] += "\n\n" + clean_poem_text(poem_text, title)
-            poems[last_poem_key]["pages"].append(filename)
-            print(f"  -> Continuation of '{last_poem_key}'")
-        else:
-            # New poem or first page
-            clean_text = clean_poem_text(poem_text, title)
-            
-            if title in poems:
-                # Same title, merge content
-                poems[title]["text"] += "\n\n" + clean_text
-                poems[title]["pages"].append(filename)
+    return get_rules().clean_text(text, title)
+
+def group_pages(page_records):
+    """Group per-page records into poems (see assemble_poems.py to re-run this on a journal)"""
+    return assemble(page_records)
+
+def iter_ocr(paths, batch_size=BATCH_SIZE, cache=None, worker=None, prompt_text=OCR_PROMPT, debug=False,
+             loop_guard=LOOP_GUARD, time_budget=TIME_BUDGET, pixel_budget=PIXEL_BUDGET,
+             prefetch_workers=PREFETCH_WORKERS, quantize=QUANTIZE, max_new_tokens=MAX_NEW_TOKENS, confidence=False):
+    """Yield one result dict per image path, in order, as soon as its batch finishes.
+
+    Pages are transcribed batch_size at a time, through the cache when one is
+    given and through a running ocr_worker.py when a client is given. Pages cut
+    off by a guardrail carry a stop_reason and are never cached. Cache lookups
+    and image decoding for upcoming pages run on background threads while the
+    model works on the current batch. With confidence=True each record also
+    carries "confidence" and "lines"; cache entries without scores then count
+    as misses.
+    """
+    cache_settings = {"max_new_tokens": max_new_tokens}
+    if pixel_budget:
+        cache_settings["pixel_budget"] = pixel_budget
+    if quantize:
+        cache_settings["quantize"] = quantize
+
+    def load(path):
+        """Hash, look up and (on a miss) decode one page; runs on a prefetch thread"""
+        started = time.perf_counter()
+        loaded = {"digest": None, "cached": None, "image": None}
+        with ocr_trace.span("load", page=os.path.basename(path)):
+            if cache is not None:
+                loaded["digest"] = file_digest(path)
+                entry = cache.get_entry(loaded["digest"], MODEL_ID, prompt_text, cache_settings)
+                if entry is not None and (not confidence or "confidence" in entry):
+                    loaded["cached"] = entry
+            if loaded["cached"] is None and not worker:
+                loaded["image"] = load_page(path, pixel_budget)
+        loaded["seconds"] = time.perf_counter() - started
+        return loaded
+
+    pages = prefetch(paths, load, workers=prefetch_workers, queue_size=max(2 * batch_size, PREFETCH_QUEUE))
+
+    while True:
+        # Pull one batch at a time so any iterable of paths (even an endless one) works
+        batch = list(islice(pages, batch_size))
+        if not batch:
+            break
+        batch_results = {}
+        timings = {path: {"load": loaded["seconds"]} for path, loaded in batch}
+
+        for path, loaded in batch:
+            if loaded["cached"] is not None:
+                entry = loaded["cached"]
+                batch_results[path] = {key: entry[key] for key in ("text", "confidence", "lines") if key in entry}
+                batch_results[path]["stop_reason"] = None
+        missing = [(path, loaded) for path, loaded in batch if path not in batch_results]
+
+        if missing:
+            # Full OCR, one generate call for the uncached pages of the batch
+            started = time.perf_counter()
+            if worker:
+                results = worker.ocr_pages([path for path, _ in missing], prompt_text, MODEL_ID, max_new_tokens,
+                                           loop_guard=loop_guard, time_budget=time_budget,
+                                           pixel_budget=pixel_budget, quantize=quantize, confidence=confidence)
             else:
-                # Brand new poem
-                poems[title] = {
-                    "title": title,
-                    "text": clean_text,
-                    "pages": [filename]
-                }
-            print(f"  -> Title: '{title}'")
-
-# Convert to list format for JSON output
-ocr_results = []
-for poem_data in poems.values():
-    ocr_results.append({
-        "filename": poem_data["pages"][0],  # First page filename
-        "title": poem_data["title"],
-        "text": poem_data["text"],
-        "pages": poem_data["pages"]  # All pages for this poem
-    })
-
-# Save to disk
-with open("ocr_output.json", "w", encoding="utf-8") as f:
-    json.dump(ocr_results, f, ensure_ascii=False, indent=2)
-
-print(f"\nOCR complete! Processed {len(ocr_results)} poems and saved to ocr_output.json")
\ No newline at end of file
+                results = ocr_pages([loaded["image"] for _, loaded in missing], prompt_text, max_new_tokens,
+                                    loop_guard=loop_guard, time_budget=time_budget,
+                                    pixel_budget=pixel_budget, quantize=quantize, confidence=confidence)
+            # Each page is charged an equal share of the batch's wall time
+            ocr_seconds = (time.perf_counter() - started) / len(missing)
+            for (path, loaded), result in zip(missing, results):
+                batch_results[path] = result
+                timings[path]["ocr"] = ocr_seconds
+                loaded["image"] = None  # Let the decoded page go as soon as it is transcribed
+                if cache is not None and result["stop_reason"] is None:
+                    scores = {key: result[key] for key in ("confidence", "lines") if key in result}
+                    cache.put(loaded["digest"], MODEL_ID, prompt_text, cache_settings, result["text"], **scores)
+
+        for path, loaded in batch:
+            filename = os.path.basename(path)
+            poem_text = batch_results[path]["text"]
+
+            # Extract title using smart heuristics
+            started = time.perf_counter()
+            with ocr_trace.span("title", page=filename):
+                title = extract_title_from_text(poem_text, filename if debug else "")
+            timings[path]["title"] = time.perf_counter() - started
+
+            # Check if this is a continuation page
+            is_continuation = get_rules().is_continuation(poem_text)
+
+            record = {
+                "filename": filename,
+                "title": title,
+                "is_continuation": is_continuation,
+                "text": poem_text,
+                "stop_reason": batch_results[path]["stop_reason"],
+                "cached": loaded["cached"] is not None,
+                "timings": timings[path]
+            }
+            # Traced pages carry their per-stage timings and token counts, scored pages their confidence
+            for key in ("stages", "tokens", "confidence", "lines"):
+                if key in batch_results[path]:
+                    record[key] = batch_results[path][key]
+            yield record
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR every scan in img/ into ocr_output.json")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help=f"pages per generate call (default {BATCH_SIZE})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="ignore the transcription cache and re-run the model on every page")
+    parser.add_argument("--worker", default=ocr_worker.DEFAULT_ADDRESS,
+                        help=f"address of a running ocr_worker.py (default {ocr_worker.DEFAULT_ADDRESS})")
+    parser.add_argument("--local", action="store_true",
+                        help="always load the model in this process, even if a worker is running")
+    parser.add_argument("--journal", default=JOURNAL_PATH,
+                        help=f"append-only per-page journal (default {JOURNAL_PATH})")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip pages already in the journal and keep appending to it")
+    parser.add_argument("--redo-flagged", action="store_true",
+                        help="like --resume, but also re-run journal pages that a guardrail cut off")
+    parser.add_argument("--time-budget", type=float, default=TIME_BUDGET, metavar="SECONDS",
+                        help="wall-clock limit per generate call; pages still running are cut off and flagged")
+    parser.add_argument("--no-loop-guard", action="store_true",
+                        help="let generation run into repeat loops instead of cutting them off")
+    parser.add_argument("--max-pixels", type=int, help="scale pages down to at most this many pixels")
+    parser.add_argument("--min-pixels", type=int, help="scale small pages up to at least this many pixels")
+    parser.add_argument("--long-edge", type=int, help="scale pages so the longer side is at most this long")
+    parser.add_argument("--prefetch-workers", type=int, default=PREFETCH_WORKERS,
+                        help=f"threads decoding upcoming pages while the model runs (default {PREFETCH_WORKERS})")
+    parser.add_argument("--quantize", choices=QUANTIZE_MODES,
+                        help="dynamic int8 CPU inference: 'int8' for the language model, 'int8-vision' to include the vision tower")
+    parser.add_argument("--processes", default="1",
+                        help="shard pages over this many model processes, each pinned to its own cores; "
+                             "'auto' uses the last --calibrate result (default 1)")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="time a page sample at 1, 2, 4, ... processes, save the best count for --processes auto, and exit")
+    parser.add_argument("--calibrate-pages", type=int, default=8,
+                        help="pages to time per process count when calibrating (default 8)")
+    parser.add_argument("--confidence", action="store_true",
+                        help="score every page and line from the token log-probabilities (for re-ocr.py --min-confidence)")
+    parser.add_argument("--rules", metavar="PATH",
+                        help="title/metadata rules for this collection (default ocr_rules.json)")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="time every stage (template, processor, prefill, decode, batch_decode), write a "
+                             "Chrome trace to PATH and print a per-stage summary at the end")
+    args = parser.parse_args()
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    if args.prefetch_workers < 1:
+        parser.error("--prefetch-workers must be at least 1")
+    if args.processes == "auto":
+        args.processes = ocr_pool.load_calibration() or 1
+    elif args.processes.isdigit() and int(args.processes) >= 1:
+        args.processes = int(args.processes)
+    else:
+        parser.error("--processes must be a positive number or 'auto'")
+    if args.rules:
+        # Through the environment, so pool processes pick the rules up as well
+        os.environ["OCR_RULES"] = args.rules
+
+    image_folder = "img"
+
+    image_files = [f for f in sorted(os.listdir(image_folder)) if f.lower().endswith((".jpg", ".jpeg", ".png"))]
+    all_files = image_files
+
+    pixel_budget = {key: value for key, value in (("max_pixels", args.max_pixels),
+                                                  ("min_pixels", args.min_pixels),
+                                                  ("long_edge", args.long_edge)) if value} or None
+    ocr_options = {
+        "batch_size": args.batch_size,
+        "loop_guard": not args.no_loop_guard,
+        "time_budget": args.time_budget,
+        "pixel_budget": pixel_budget,
+        "prefetch_workers": args.prefetch_workers,
+        "quantize": args.quantize,
+        "confidence": args.confidence
+    }
+
+    if args.calibrate:
+        sample = [os.path.join(image_folder, filename) for filename in image_files[:args.calibrate_pages]]
+        processes, measurements = ocr_pool.calibrate(sample, **ocr_options)
+        ocr_pool.save_calibration(processes, measurements)
+        print(f"\nBest: {processes} process(es), saved to {ocr_pool.CALIBRATION_PATH} for --processes auto")
+        return
+
+    # Every finished page goes straight to the journal; --resume picks up where a crash left off
+    if args.resume or args.redo_flagged:
+        # Only each page's newest record counts: a page whose latest pass was flagged is redone
+        done = {record["filename"] for record in latest_pages(read_journal(args.journal))
+                if not (args.redo_flagged and record.get("stop_reason"))}
+        image_files = [filename for filename in image_files if filename not in done]
+        print(f"Resuming: {len(done)} pages already in {args.journal}, {len(image_files)} to go")
+    journal = PageJournal(args.journal, resume=args.resume or args.redo_flagged)
+
+    # Cached transcriptions are reused as long as image, model, prompt and settings match
+    cache = None if args.no_cache else OCRCache()
+
+    # Hand pages to a warm worker when one is running, otherwise load the model here
+    # (in one process, or one per core group with --processes)
+    worker = None if args.local else ocr_worker.connect(args.worker)
+    paths = [os.path.join(image_folder, filename) for filename in image_files]
+    if args.trace:
+        ocr_trace.enable()
+        if worker or args.processes > 1:
+            print("Note: --trace only times pages transcribed in this process, not in a worker or pool process")
+    if worker:
+        print(f"Using OCR worker at {args.worker}")
+        records = iter_ocr(paths, cache=cache, worker=worker, debug=True, **ocr_options)
+    elif args.processes > 1:
+        print(f"Using {args.processes} OCR processes")
+        records = ocr_pool.iter_ocr_parallel(paths, args.processes, use_cache=cache is not None, **ocr_options)
+    else:
+        records = iter_ocr(paths, cache=cache, debug=True, **ocr_options)
+
+    run_records = []
+    for record in records:
+        journal.append(record)
+        if args.trace:
+            run_records.append(record)
+        source = " (cached)" if record["cached"] else ""
+        if record["stop_reason"]:
+            print(f"  !! {record['filename']}: cut off ({record['stop_reason']}), flagged for reprocessing")
+        if record["is_continuation"]:
+            print(f"  -> {record['filename']}: continuation page{source}")
+        else:
+            print(f"  -> {record['filename']}: title '{record['title']}'{source}")
+
+    journal.close()
+    if worker:
+        worker.close()
+
+    # Rebuild the poems from the journal, in filename order (last record wins if a page repeats)
+    current_files = set(all_files)
+    records = [record for record in latest_pages(read_journal(args.journal)) if record["filename"] in current_files]
+    ocr_results = group_pages(records)
+    flagged = [record for record in records if record.get("stop_reason")]
+
+    # Save to disk
+    with open("ocr_output.json", "w", encoding="utf-8") as f:
+        json.dump(ocr_results, f, ensure_ascii=False, indent=2)
+
+    print(f"\nOCR complete! Processed {len(ocr_results)} poems and saved to ocr_output.json")
+    if flagged:
+        print(f"{len(flagged)} pages were cut off by a guardrail (rerun with --redo-flagged):")
+        for record in flagged:
+            print(f"  - {record['filename']}: {record['stop_reason']}")
+
+    if args.trace:
+        ocr_trace.active().write_chrome_trace(args.trace)
+        print(f"\n{ocr_trace.summarize(run_records)}")
+        print(f"Chrome trace saved to {args.trace} (open in chrome://tracing or https://ui.perfetto.dev)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import os
+import json
+import hashlib
+import shutil
+import argparse
+
+# Default cache location and size bound (bytes on disk across all models)
+CACHE_DIR = "ocr_cache"
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+def file_digest(path):
+    """SHA-256 of a file's raw bytes, read in chunks so large scans stay cheap"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class OCRCache:
+    """Transcriptions on disk, keyed by image hash + model id + prompt + generation settings.
+
+    Entries live under one directory per model so a model can be invalidated in
+    one go. When the cache grows past max_bytes the least recently used entries
+    are removed (a hit refreshes the entry's mtime).
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._total_bytes = None  # Computed lazily on the first write
+
+    def _model_dir(self, model_id):
+        return os.path.join(self.cache_dir, model_id.replace("/", "--"))
+
+    def _entry_path(self, digest, model_id, prompt, settings):
+        key_source = json.dumps([digest, model_id, prompt, settings or {}], sort_keys=True, ensure_ascii=False)
+        key = hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+        return os.path.join(self._model_dir(model_id), key[:2], key + ".json")
+
+    def get(self, digest, model_id, prompt, settings=None):
+        """Return the cached transcription, or None on a miss"""
+        entry = self.get_entry(digest, model_id, prompt, settings)
+        return entry["text"] if entry is not None else None
+
+    def get_entry(self, digest, model_id, prompt, settings=None):
+        """Return the whole cached entry (text plus anything stored with it), or None on a miss"""
+        path = self._entry_path(digest, model_id, prompt, settings)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        try:
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            pass
+        return entry
+
+    def put(self, digest, model_id, prompt, settings, text, **extra):
+        """Store a transcription (and extra fields such as confidence scores), then evict if over the size bound"""
+        path = self._entry_path(digest, model_id, prompt, settings)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            "image": digest,
+            "model": model_id,
+            "prompt": prompt,
+            "settings": settings or {},
+            "text": text,
+            **extra
+        }
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+
+        # Write to a temp file and rename so a crash never leaves a half entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        if self._total_bytes is None:
+            self._total_bytes = self._scan_total()
+        else:
+            self._total_bytes += os.path.getsize(path) - old_size
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        """Yield (mtime, size, path) for every entry in the cache"""
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue  # Evicted by another process sharing the cache
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _scan_total(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Another process got there first
+            total -= size
+            removed += 1
+        self._total_bytes = total
+        return removed
+
+    def invalidate_model(self, model_id):
+        """Drop every entry produced by model_id, returning how many were removed"""
+        model_dir = self._model_dir(model_id)
+        if not os.path.isdir(model_dir):
+            return 0
+        count = sum(1 for _, _, files in os.walk(model_dir) for name in files if name.endswith(".json"))
+        shutil.rmtree(model_dir)
+        self._total_bytes = None
+        return count
+
+    def stats(self):
+        """Entry count and bytes per model directory"""
+        per_model = {}
+        for _, size, path in self._entries():
+            model = os.path.relpath(path, self.cache_dir).split(os.sep)[0].replace("--", "/")
+            count, total = per_model.get(model, (0, 0))
+            per_model[model] = (count + 1, total + size)
+        return per_model
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or prune the OCR transcription cache")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--invalidate", metavar="MODEL_ID", help="remove every entry for this model")
+    parser.add_argument("--max-mb", type=float, help="evict least recently used entries down to this size")
+    args = parser.parse_args()
+
+    cache = OCRCache(args.cache_dir)
+    if args.invalidate:
+        print(f"Removed {cache.invalidate_model(args.invalidate)} entries for {args.invalidate}")
+    if args.max_mb is not None:
+        cache.max_bytes = int(args.max_mb * 1024 * 1024)
+        print(f"Evicted {cache.evict()} entries")
+
+    for model, (count, total) in sorted(cache.stats().items()):
+        print(f"  {model}: {count} entries, {total / (1024 * 1024):.1f} MB")
@@ -0,0 +1,101 @@
+import math
+import difflib
+import torch
+from transformers import LogitsProcessor
+
+class TokenLogprobRecorder(LogitsProcessor):
+    """Leaves the scores untouched; records the log-probability of every token generate() picks.
+
+    Each call keeps the current step's log-softmax, and the next call (whose
+    input_ids end with the token that was picked) looks up that token's
+    entry, so only one step of scores is ever held in memory.
+    """
+
+    def __init__(self):
+        self.steps = []
+        self._pending = None
+
+    def _collect(self, chosen):
+        if self._pending is not None:
+            self.steps.append(self._pending.gather(1, chosen[:, None].to(self._pending.device))[:, 0].cpu())
+            self._pending = None
+
+    def __call__(self, input_ids, scores):
+        self._collect(input_ids[:, -1])
+        self._pending = torch.log_softmax(scores.float(), dim=-1)
+        return scores
+
+    def finish(self, output_ids):
+        """[batch, generated tokens] tensor of log-probabilities, once generate() has returned"""
+        self._collect(output_ids[:, -1])
+        if not self.steps:
+            return torch.zeros(output_ids.shape[0], 0)
+        return torch.stack(self.steps, dim=1)
+
+def _mean_probability(logprobs):
+    """Geometric-mean token probability, rounded for the output files"""
+    return round(math.exp(sum(logprobs) / len(logprobs)), 4)
+
+def score_tokens(tokenizer, token_ids, logprobs):
+    """Page confidence and per-line {"text", "confidence"} for one generated sequence.
+
+    token_ids and logprobs cover the generated tokens up to (not including)
+    EOS. Each token counts towards the line it starts on; blank lines get a
+    confidence of None, and blank lines at either end are dropped as the
+    page text's strip() drops them, so joining the lines with newlines gives
+    the page text back.
+    """
+    if not token_ids:
+        return None, []
+    text = tokenizer.decode(token_ids, skip_special_tokens=True)
+    line_texts = text.split("\n")
+    line_logprobs = [[] for _ in line_texts]
+    line = 0
+    for token_id, logprob in zip(token_ids, logprobs):
+        line_logprobs[min(line, len(line_texts) - 1)].append(logprob)
+        line += tokenizer.decode([token_id], skip_special_tokens=True).count("\n")
+
+    # Indentation is kept so lines can be joined back into the page text
+    lines = [{"text": line_text.rstrip(), "confidence": _mean_probability(scores) if line_text.strip() and scores else None}
+             for line_text, scores in zip(line_texts, line_logprobs)]
+    while lines and not lines[0]["text"].strip():
+        lines.pop(0)
+    while lines and not lines[-1]["text"].strip():
+        lines.pop()
+    return _mean_probability(logprobs), lines
+
+def low_confidence_lines(lines, threshold):
+    """Lines scored below threshold"""
+    return [line for line in lines if line["confidence"] is not None and line["confidence"] < threshold]
+
+def needs_review(record, threshold):
+    """True if a page (a record with "confidence" and "lines") or any of its lines falls below threshold"""
+    if record.get("confidence") is None:
+        return False
+    return record["confidence"] < threshold or bool(low_confidence_lines(record.get("lines", []), threshold))
+
+def lines_text(lines):
+    """Page text from its scored lines"""
+    return "\n".join(line["text"] for line in lines).strip()
+
+def merge_lines(lines, alternative, threshold):
+    """Replace lines below threshold with the matching lines of another transcription where it is surer.
+
+    The two transcriptions are aligned with difflib on the line text; only
+    lines that line up one-to-one are swapped, so a retry can't add or drop
+    lines. Returns (merged lines, number replaced).
+    """
+    merged = list(lines)
+    replaced = 0
+    matcher = difflib.SequenceMatcher(None, [line["text"].strip() for line in lines],
+                                      [line["text"].strip() for line in alternative], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "replace" or i2 - i1 != j2 - j1:
+            continue
+        for i, j in zip(range(i1, i2), range(j1, j2)):
+            old, new = lines[i], alternative[j]
+            if (old["confidence"] is not None and old["confidence"] < threshold and
+                    new["confidence"] is not None and new["confidence"] > old["confidence"]):
+                merged[i] = new
+                replaced += 1
+    return merged, replaced
@@ -0,0 +1,66 @@
+import os
+import json
+
+# Default location of the per-page journal written by ocr.py
+JOURNAL_PATH = "ocr_journal.jsonl"
+
+class PageJournal:
+    """Append-only JSON-lines file with one record per OCR'd page.
+
+    Every record is flushed and fsynced as soon as it is written, so a crash
+    loses at most the page that was in flight.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, resume=False):
+        self.path = path
+        if resume:
+            _drop_torn_tail(path)
+        self.file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def append(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def write_jsonl(records, path, fsync=False):
+    """Write records (e.g. from ocr.iter_ocr) one JSON line at a time, flushing after each"""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+            count += 1
+    return count
+
+def _drop_torn_tail(path):
+    """Cut off a half-written last line left behind by a crash mid-append"""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+def read_journal(path=JOURNAL_PATH):
+    """Load every complete record from a journal; a missing journal is empty"""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break  # Torn last line from a crash
+            if line.strip():
+                records.append(json.loads(line))
+    return records
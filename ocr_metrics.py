@@ -0,0 +1,19 @@
+def edit_distance(a, b):
+    """Levenshtein distance between two sequences, using two rows of the DP table"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, item_a in enumerate(a, 1):
+        current = [i]
+        for j, item_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1,          # Deletion
+                               current[j - 1] + 1,       # Insertion
+                               previous[j - 1] + (item_a != item_b)))  # Substitution
+        previous = current
+    return previous[-1]
+
+def character_error_rate(hypothesis, reference):
+    """Character edits needed to turn hypothesis into reference, per reference character"""
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    return edit_distance(hypothesis, reference) / len(reference)
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import queue
+import multiprocessing
+
+# Where --calibrate stores the best process count for this machine
+CALIBRATION_PATH = "ocr_pool_calibration.json"
+
+# How often the parent checks that pool processes are still alive while it waits for results
+POLL_SECONDS = 5
+
+def available_cores():
+    """CPU cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def partition_cores(cores, processes):
+    """Split cores into `processes` disjoint, contiguous groups of (almost) equal size"""
+    groups = []
+    start = 0
+    for index in range(processes):
+        size = len(cores) // processes + (1 if index < len(cores) % processes else 0)
+        groups.append(cores[start:start + size] or cores[:1])
+        start += size
+    return groups
+
+def _shard_main(worker_index, shard, cores, options, results):
+    """Body of one pool process: pin to its cores, load the model once, OCR its shard"""
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    import torch
+    torch.set_num_threads(len(cores))
+    import ocr
+    from ocr_cache import OCRCache
+
+    cache = OCRCache() if options.pop("use_cache") else None
+    try:
+        indexes = [index for index, _ in shard]
+        paths = [path for _, path in shard]
+        # iter_ocr yields exactly one record per path, in order
+        for index, record in zip(indexes, ocr.iter_ocr(paths, cache=cache, **options)):
+            results.put(("page", worker_index, index, record))
+    except Exception as e:
+        results.put(("error", worker_index, None, f"{type(e).__name__}: {e}"))
+    results.put(("done", worker_index, None, None))
+
+def iter_ocr_parallel(paths, processes, use_cache=True, **options):
+    """ocr.iter_ocr() spread over `processes` pool processes, each with its own share of the cores.
+
+    Pages are dealt out round-robin so every process stays busy, and records
+    are yielded back in the original order of paths. Each record gains a
+    "worker" field with the index of the process that produced it.
+    """
+    paths = list(paths)
+    cores = available_cores()
+    processes = max(1, min(processes, len(paths), len(cores)))
+    core_groups = partition_cores(cores, processes)
+
+    # Spawn, not fork: a forked child would inherit torch's thread pools
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = []
+    for worker_index in range(processes):
+        shard = [(index, paths[index]) for index in range(worker_index, len(paths), processes)]
+        worker_options = dict(options, use_cache=use_cache, debug=False)
+        worker = context.Process(target=_shard_main,
+                                 args=(worker_index, shard, core_groups[worker_index], worker_options, results),
+                                 daemon=True)
+        worker.start()
+        workers.append(worker)
+
+    # Hold early arrivals until every page before them has been yielded
+    waiting = {}
+    next_index = 0
+    finished = set()
+    try:
+        while len(finished) < processes:
+            try:
+                kind, worker_index, index, payload = results.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                # A process killed outright (e.g. by the OOM killer) never posts "done"
+                for worker_index, worker in enumerate(workers):
+                    if worker_index not in finished and worker.exitcode is not None:
+                        raise RuntimeError(f"OCR pool process {worker_index} died with exit code {worker.exitcode} "
+                                           f"before finishing its pages (out of memory?)")
+                continue
+            if kind == "page":
+                payload["worker"] = worker_index
+                waiting[index] = payload
+                while next_index in waiting:
+                    yield waiting.pop(next_index)
+                    next_index += 1
+            elif kind == "error":
+                raise RuntimeError(f"OCR pool process {worker_index} failed: {payload}")
+            else:
+                finished.add(worker_index)
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+def calibrate(paths, candidates=None, **options):
+    """Time a page sample at several process counts and return (best count, measurements).
+
+    Throughput excludes model loading (and image loading, which overlaps with
+    generation): each process's time is the sum of its pages' OCR and title
+    times, and the slowest process sets the pace.
+    """
+    cores = available_cores()
+    if candidates is None:
+        candidates = []
+        count = 1
+        while count <= len(cores):
+            candidates.append(count)
+            count *= 2
+    measurements = []
+    for processes in candidates:
+        print(f"Calibrating with {processes} process(es)...")
+        busy = {}
+        pages = 0
+        for record in iter_ocr_parallel(paths, processes, use_cache=False, **options):
+            timings = record["timings"]
+            busy[record["worker"]] = busy.get(record["worker"], 0.0) + timings.get("ocr", 0.0) + timings.get("title", 0.0)
+            pages += 1
+        pages_per_second = pages / max(busy.values()) if busy and max(busy.values()) > 0 else 0.0
+        measurements.append({"processes": processes, "pages": pages, "pages_per_second": pages_per_second})
+        print(f"  {pages_per_second:.3f} pages/s")
+    best = max(measurements, key=lambda m: m["pages_per_second"])
+    return best["processes"], measurements
+
+def save_calibration(processes, measurements, path=CALIBRATION_PATH):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "processes": processes,
+            "cores": len(available_cores()),
+            "calibrated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "measurements": measurements
+        }, f, indent=2)
+
+def load_calibration(path=CALIBRATION_PATH):
+    """Process count chosen by the last --calibrate run, or None if there isn't one"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["processes"]
@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import multiprocessing
+
+# Accepted values for --quantize in the OCR scripts
+QUANTIZE_MODES = ("int8", "int8-vision")
+
+# How often compare() checks that a measurement process is still alive while it waits for its report
+POLL_SECONDS = 5
+
+def quantize_model(model, mode):
+    """Apply dynamic int8 quantization to a CPU model's nn.Linear layers, in place.
+
+    "int8" covers the language model and lm_head; "int8-vision" also covers
+    the vision tower. Weights are stored as int8 and activations are quantized
+    on the fly, so no calibration data is needed.
+    """
+    import torch
+    if mode not in QUANTIZE_MODES:
+        raise ValueError(f"Unknown quantize mode '{mode}', expected one of {QUANTIZE_MODES}")
+    if model.device.type != "cpu":
+        raise ValueError("Dynamic int8 quantization only runs on CPU")
+
+    include_vision = mode == "int8-vision"
+    qconfig_spec = {
+        name: torch.ao.quantization.default_dynamic_qconfig
+        for name, module in model.named_modules()
+        if isinstance(module, torch.nn.Linear) and (include_vision or "visual" not in name.split("."))
+    }
+    torch.ao.quantization.quantize_dynamic(model, qconfig_spec, dtype=torch.qint8, inplace=True)
+    if include_vision:
+        # Some transformers releases (e.g. 4.51) read the vision tower's dtype/device from
+        # blocks[0].mlp.fc2.weight, which a quantized Linear exposes as a method, not a tensor.
+        # Answer from a parameter quantization left alone (the patch embedding) instead.
+        visual = model.visual if hasattr(model, "visual") else model.model.visual
+        float_parameter = next(visual.parameters())
+        visual.get_dtype = lambda: float_parameter.dtype
+        visual.get_device = lambda: float_parameter.device
+    return model
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _run_mode(mode, paths, results):
+    """Body of one measurement process: load the model in `mode`, OCR the pages, report back"""
+    import ocr
+    from page_images import load_page
+
+    started = time.perf_counter()
+    processor, _ = ocr.load_model(quantize=mode)
+    load_seconds = time.perf_counter() - started
+
+    texts = []
+    generated_tokens = 0
+    started = time.perf_counter()
+    for path in paths:
+        page = ocr.ocr_pages([load_page(path)], ocr.OCR_PROMPT, quantize=mode)[0]
+        texts.append(page["text"])
+        generated_tokens += len(processor.tokenizer(page["text"]).input_ids)
+    ocr_seconds = time.perf_counter() - started
+
+    results.put({
+        "mode": mode or "fp32",
+        "load_seconds": load_seconds,
+        "pages_per_second": len(paths) / ocr_seconds if ocr_seconds > 0 else 0.0,
+        "tokens_per_second": generated_tokens / ocr_seconds if ocr_seconds > 0 else 0.0,
+        "peak_rss_mb": _peak_rss_mb(),
+        "texts": texts
+    })
+
+def compare(paths, modes=(None,) + QUANTIZE_MODES):
+    """Measure each mode in a fresh process (so peak RSS is its own) and report drift vs. fp32"""
+    from ocr_metrics import character_error_rate
+
+    if not paths:
+        raise ValueError("No pages to measure")
+    context = multiprocessing.get_context("spawn")
+    reports = []
+    for mode in modes:
+        print(f"Measuring {mode or 'fp32'}...")
+        results = context.Queue()
+        process = context.Process(target=_run_mode, args=(mode, paths, results))
+        process.start()
+        while True:
+            try:
+                report = results.get(timeout=POLL_SECONDS)
+                break
+            except queue.Empty:
+                # A process killed outright (e.g. out of memory loading the fp32 model) never reports
+                if process.exitcode is not None:
+                    raise RuntimeError(f"Measuring {mode or 'fp32'} failed: the process exited with code "
+                                       f"{process.exitcode} (out of memory?)")
+        process.join()
+        reports.append(report)
+
+    baseline = reports[0]["texts"]
+    for report in reports:
+        drifts = [character_error_rate(text, reference) for text, reference in zip(report["texts"], baseline)]
+        report["mean_drift_cer"] = sum(drifts) / len(drifts) if drifts else 0.0
+        report["changed_pages"] = sum(1 for drift in drifts if drift > 0)
+    return reports
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare fp32 and int8 OCR: throughput, peak RSS and transcription drift")
+    parser.add_argument("pages", nargs="*", help="page images (default: the first --limit images in img/)")
+    parser.add_argument("--limit", type=int, default=10, help="pages to use when none are given (default 10)")
+    parser.add_argument("--output", default="quantize_report.json", help="machine-readable report")
+    args = parser.parse_args()
+
+    paths = args.pages or [os.path.join("img", f) for f in sorted(os.listdir("img"))
+                           if f.lower().endswith((".jpg", ".jpeg", ".png"))][:args.limit]
+    if not paths:
+        parser.error("no page images given or found in img/")
+    reports = compare(paths)
+
+    print(f"\n{'mode':<14}{'pages/s':>9}{'tokens/s':>10}{'peak RSS MB':>13}{'drift CER':>11}{'changed':>9}")
+    for report in reports:
+        print(f"{report['mode']:<14}{report['pages_per_second']:>9.3f}{report['tokens_per_second']:>10.1f}"
+              f"{report['peak_rss_mb']:>13.0f}{report['mean_drift_cer']:>11.4f}"
+              f"{report['changed_pages']:>6}/{len(paths)}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"pages": [os.path.basename(path) for path in paths], "reports": reports},
+                  f, ensure_ascii=False, indent=2)
+    print(f"Saved report to {args.output}")
@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import argparse
+
+# Title and metadata rules for the poems; point OCR_RULES at another file for a different collection
+RULES_PATH = os.environ.get("OCR_RULES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ocr_rules.json"))
+
+def _trie_pattern(phrases):
+    """Regex source matching any of phrases, built from their shared-prefix trie.
+
+    Each alternation branches on a distinct next character, so the regex
+    engine follows at most one branch per input character and the cost of a
+    search depends on the line, not on how many phrases there are.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = True  # A phrase ends here
+
+    def build(node):
+        # For a yes/no search a phrase that ends here already matches; longer ones add nothing
+        if "" in node:
+            return ""
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    return build(trie) if trie else "(?!)"  # (?!) never matches
+
+class PhraseMatcher:
+    """Case-insensitive substring test against a whole phrase list, compiled once"""
+
+    def __init__(self, phrases, anchored=False):
+        self.phrases = sorted({phrase.lower() for phrase in phrases if phrase})
+        self.pattern = re.compile(_trie_pattern(self.phrases))
+        self.anchored = anchored
+
+    def __call__(self, lowered):
+        """True if an (already lowercased) line contains a phrase, or starts with one when anchored"""
+        found = self.pattern.match(lowered) if self.anchored else self.pattern.search(lowered)
+        return found is not None
+
+def _load_phrases(entries, base_dir):
+    """Phrase list from config: plain strings, or {"file": path} for one phrase per line"""
+    phrases = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            with open(os.path.join(base_dir, entry["file"]), "r", encoding="utf-8") as f:
+                phrases.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+        else:
+            phrases.append(entry)
+    return phrases
+
+class Rules:
+    """Compiled title/metadata rules: title extraction, metadata stripping and continuation checks"""
+
+    def __init__(self, config, base_dir="."):
+        self.scan_lines = config["scan_lines"]
+        self.caps_ratio = config["caps_ratio"]
+        self.title_case_max_length = config["title_case_max_length"]
+        self.short_line_max_words = config["short_line_max_words"]
+        self.title_strip_lines = config["title_strip_lines"]
+        self.title_overlap = config["title_overlap"]
+
+        self.title_skip = PhraseMatcher(_load_phrases(config["title_skip_phrases"], base_dir))
+        self.metadata = PhraseMatcher(_load_phrases(config["metadata_phrases"], base_dir))
+        self.continuation = PhraseMatcher(_load_phrases(config["continuation_markers"], base_dir))
+        self.non_title_opener = PhraseMatcher(_load_phrases(config["non_title_openers"], base_dir), anchored=True)
+        self.non_title_characters = re.compile("[" + re.escape(config["non_title_characters"]) + "]")
+
+    def is_continuation(self, text):
+        """True if a page carries a continuation marker such as "(continued)" """
+        return self.continuation(text.lower())
+
+    def extract_title(self, full_text, debug_filename="", debug_label="Analyzing"):
+        """Extract title from full OCR text using smart heuristics"""
+        lines = [line.strip() for line in full_text.split('\n') if line.strip()]
+
+        if debug_filename:
+            print(f"\nDebug - {debug_label} {debug_filename}:")
+            for i, line in enumerate(lines[:self.scan_lines]):
+                print(f"  {i}: '{line}'")
+
+        # Look for title in first several lines
+        for i, line in enumerate(lines[:self.scan_lines]):
+            # Skip page numbers and very short lines
+            if line.isdigit() or len(line) < 2:
+                continue
+
+            # Skip common non-title elements and continuation markers
+            lowered = line.lower()
+            if self.title_skip(lowered) or self.continuation(lowered):
+                continue
+
+            # Skip parenthetical subtitles for now (we'll add them back later)
+            if line.startswith("(") and line.endswith(")"):
+                continue
+
+            # Look for title characteristics
+            is_likely_title = False
+
+            # All caps or mostly caps (allowing for some lowercase)
+            if line.isupper() or (sum(1 for c in line if c.isupper()) > len(line) * self.caps_ratio):
+                is_likely_title = True
+
+            # Title case and reasonable length
+            elif line.istitle() and 2 <= len(line) <= self.title_case_max_length:
+                is_likely_title = True
+
+            # Check if it's a short line that's not clearly poem content
+            elif (len(line.split()) <= self.short_line_max_words and
+                  not self.non_title_opener(lowered) and
+                  not self.non_title_characters.search(line)):
+                is_likely_title = True
+
+            if is_likely_title:
+                title = line.strip()
+
+                # Check if next line is a subtitle in parentheses
+                if i + 1 < len(lines):
+                    next_line = lines[i + 1].strip()
+                    if next_line.startswith("(") and next_line.endswith(")"):
+                        title += f" {next_line}"
+
+                # Clean up spacing (fix OCR issues like "L E G E R D E M A I N")
+                if len(title.split()) > 3 and all(len(word) <= 2 for word in title.split() if word.isalpha()):
+                    title = ''.join(title.split())
+
+                if debug_filename:
+                    print(f"  -> Found title: '{title}'")
+                return title
+
+        if debug_filename:
+            print("  -> No title found, using 'Untitled'")
+        return "Untitled"
+
+    def clean_text(self, text, title):
+        """Remove title and other metadata from poem text"""
+        lines = text.split('\n')
+        cleaned_lines = []
+
+        # Remove title lines from the beginning
+        title_words = set(title.lower().replace('(', '').replace(')', '').split())
+
+        for i, line in enumerate(lines):
+            lowered = line.lower()
+            line_words = set(lowered.replace('(', '').replace(')', '').split())
+
+            # Skip lines that are primarily the title
+            if (i < self.title_strip_lines and title_words and
+                    len(title_words.intersection(line_words)) > len(title_words) * self.title_overlap):
+                continue
+
+            # Skip metadata lines
+            if self.metadata(lowered):
+                continue
+
+            cleaned_lines.append(line)
+
+        return '\n'.join(cleaned_lines).strip()
+
+def load_rules(path=RULES_PATH):
+    """Read a rules config (phrase files are resolved relative to it) and compile it"""
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    return Rules(config, os.path.dirname(os.path.abspath(path)))
+
+_rules = {}
+
+def get_rules(path=None):
+    """Compiled rules for path (default RULES_PATH, or $OCR_RULES), loaded once per process"""
+    path = path or os.environ.get("OCR_RULES", RULES_PATH)
+    if path not in _rules:
+        _rules[path] = load_rules(path)
+    return _rules[path]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check a rules file: phrase counts and the title found for sample text")
+    parser.add_argument("--rules", default=RULES_PATH, help=f"rules config (default {RULES_PATH})")
+    parser.add_argument("text_files", nargs="*", help="OCR text files to extract titles from")
+    args = parser.parse_args()
+
+    rules = load_rules(args.rules)
+    print(f"{args.rules}: {len(rules.title_skip.phrases)} title skip phrases, "
+          f"{len(rules.metadata.phrases)} metadata phrases, {len(rules.continuation.phrases)} continuation markers")
+    for text_file in args.text_files:
+        with open(text_file, "r", encoding="utf-8") as f:
+            text = f.read()
+        continuation = " (continuation)" if rules.is_continuation(text) else ""
+        print(f"  {text_file}: '{rules.extract_title(text)}'{continuation}")
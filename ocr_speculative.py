@@ -0,0 +1,91 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+import torch
+from transformers.generation.candidate_generator import CandidateGenerator
+
+class PriorTextCandidateGenerator(CandidateGenerator):
+    """Draft tokens for assisted generation from an earlier transcription of the same page.
+
+    Works like prompt-lookup decoding, except that the n-gram search runs
+    over the prior transcription instead of the prompt. The last few
+    generated tokens are looked up in the draft, and the tokens that followed
+    them there are proposed as candidates. The model verifies a whole run of
+    candidates in one forward pass, so long stretches the earlier pass got
+    right cost one pass instead of one per token. With greedy decoding the
+    output is the same as without a draft.
+    """
+
+    def __init__(self, draft_ids, prompt_length, eos_token_ids, max_length, num_tokens=10, max_ngram=3):
+        self.draft_ids = draft_ids
+        self.prompt_length = prompt_length
+        self.eos_token_ids = set(eos_token_ids)
+        self.max_length = max_length
+        self.num_tokens = num_tokens
+        self.max_num_tokens = num_tokens * 2
+        self.max_ngram = max_ngram
+        self.cursor = 0  # Where in the draft the last accepted candidates ended
+        self.last_proposed = 0
+        self.proposed = 0
+        self.accepted = 0
+        self.passes = 0
+
+        # End positions of every n-gram in the draft, in order, so a lookup is a dict hit
+        self.index = {}
+        for n in range(1, max_ngram + 1):
+            for end in range(n, len(draft_ids) + 1):
+                self.index.setdefault(tuple(draft_ids[end - n:end]), []).append(end)
+
+    def _find(self, generated):
+        """Draft position right after the longest n-gram ending the generated tokens, or None"""
+        if not generated:
+            return 0
+        for n in range(min(self.max_ngram, len(generated)), 0, -1):
+            ends = self.index.get(tuple(generated[-n:]))
+            if ends:
+                # Prefer the next occurrence at or after where drafting left off (refrains repeat)
+                position = bisect_left(ends, self.cursor)
+                return ends[position] if position < len(ends) else ends[0]
+        return None
+
+    def get_candidates(self, input_ids):
+        self.passes += 1
+        self.last_proposed = 0
+        length = min(self.num_tokens, self.max_length - input_ids.shape[1] - 1)
+        start = self._find(input_ids[0, self.prompt_length:].tolist()) if length > 0 else None
+        if start is None:
+            return input_ids, None
+
+        candidates = []
+        for token_id in self.draft_ids[start:start + length]:
+            candidates.append(token_id)
+            if token_id in self.eos_token_ids:
+                break
+        if not candidates:
+            return input_ids, None
+        self.cursor = start
+        self.last_proposed = len(candidates)
+        self.proposed += len(candidates)
+        candidate_ids = torch.tensor([candidates], dtype=input_ids.dtype, device=input_ids.device)
+        return torch.cat([input_ids, candidate_ids], dim=1), None
+
+    def update_candidate_strategy(self, input_ids, scores, num_matches):
+        self.accepted += num_matches
+        self.cursor += num_matches
+        # Draft longer runs while the model keeps agreeing, shorter ones once it starts to diverge
+        if self.last_proposed and num_matches == self.last_proposed:
+            self.num_tokens = min(self.num_tokens + 2, self.max_num_tokens)
+        else:
+            self.num_tokens = max(1, self.num_tokens - 1)
+
+@contextmanager
+def drafting(model, generator):
+    """Make model.generate() take its candidates from generator inside the with block.
+
+    generate() only takes the assisted path when prompt_lookup_num_tokens
+    (or an assistant model) is given, so pass prompt_lookup_num_tokens too.
+    """
+    model._get_candidate_generator = lambda *args, **kwargs: generator
+    try:
+        yield generator
+    finally:
+        del model._get_candidate_generator  # Back to the class's own method
@@ -0,0 +1,64 @@
+import time
+import torch
+from transformers import StoppingCriteria
+
+class RepetitionLoopCriteria(StoppingCriteria):
+    """Stop a sequence once its newest tokens are one n-gram repeated back to back.
+
+    A period p counts as a loop when the last max(min_repeats, ceil(min_span / p))
+    copies of it are identical, so short periods (e.g. a single token) need a
+    longer run before they are cut off than long ones. Sequences that trip the
+    check are remembered in self.looped; sequences that already emitted an end
+    token (and are only being padded in a batch) are never flagged.
+    """
+
+    def __init__(self, prompt_length, eos_token_ids, max_ngram=32, min_repeats=4, min_span=64):
+        self.prompt_length = prompt_length
+        self.eos_token_ids = eos_token_ids
+        self.max_ngram = max_ngram
+        self.min_repeats = min_repeats
+        self.min_span = min_span
+        self.looped = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        batch_size, length = input_ids.shape
+        generated = length - self.prompt_length
+        if self.looped is None:
+            self.looped = torch.zeros(batch_size, dtype=torch.bool, device=input_ids.device)
+
+        looping = torch.zeros(batch_size, dtype=torch.bool, device=input_ids.device)
+        for period in range(1, self.max_ngram + 1):
+            repeats = max(self.min_repeats, -(-self.min_span // period))
+            span = period * repeats
+            if span > generated:
+                continue
+            tail = input_ids[:, -span:].reshape(batch_size, repeats, period)
+            looping |= (tail == tail[:, -1:, :]).all(dim=2).all(dim=1)
+
+        finished = torch.isin(input_ids[:, self.prompt_length:],
+                              torch.tensor(self.eos_token_ids, device=input_ids.device)).any(dim=1)
+        looping &= ~finished
+        self.looped |= looping
+        return looping
+
+class TimeBudgetCriteria(StoppingCriteria):
+    """Stop every sequence once the generate call has used up its wall-clock budget"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.expired = False
+
+    def __call__(self, input_ids, scores, **kwargs):
+        self.expired = time.monotonic() - self.started > self.seconds
+        return torch.full((input_ids.shape[0],), self.expired, dtype=torch.bool, device=input_ids.device)
+
+class StepTimer(StoppingCriteria):
+    """Never stops generation; timestamps every decode step so prefill and decode can be split"""
+
+    def __init__(self):
+        self.step_times = []
+
+    def __call__(self, input_ids, scores, **kwargs):
+        self.step_times.append(time.perf_counter())
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
@@ -0,0 +1,246 @@
+import os
+import json
+import sqlite3
+import argparse
+from contextlib import contextmanager
+
+# Default store location, and the JSON file it mirrors for makePDF.py / makeTex.py
+STORE_PATH = "ocr_output.db"
+JSON_PATH = "ocr_output.json"
+
+# Poem fields with their own columns; anything else (flags, confidence, ...) is kept as JSON in "extra"
+POEM_FIELDS = ("filename", "title", "text", "pages")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS poems (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    text TEXT NOT NULL,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS poems_title ON poems (title COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS poems_position ON poems (position);
+CREATE TABLE IF NOT EXISTS pages (
+    filename TEXT PRIMARY KEY,
+    poem_id INTEGER NOT NULL REFERENCES poems (id) ON DELETE CASCADE,
+    page_order INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_poem ON pages (poem_id, page_order);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+def _file_stamp(path):
+    """Size and mtime of a file, to tell whether it changed since the store last read or wrote it"""
+    stat = os.stat(path)
+    return json.dumps([stat.st_size, stat.st_mtime_ns])
+
+class OCRStore:
+    """Poems and their pages in SQLite, in place of rewriting ocr_output.json on every change.
+
+    A poem row holds the title and assembled text; each page row points at
+    its poem, so "which poem has this page" and "pages of poem X" are index
+    lookups. Every change runs in a transaction, so a crash leaves either
+    the old or the new state, never half a file. import_json()/export_json()
+    convert from and to the list format ocr.py writes, which the exporters
+    still read.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextmanager
+    def transaction(self):
+        """Group several changes so they commit together (or roll back together on an exception)"""
+        with self.db:
+            yield self
+
+    # --- Reading ---
+
+    def _poem(self, row):
+        pages = [page["filename"] for page in self.db.execute(
+            "SELECT filename FROM pages WHERE poem_id = ? ORDER BY page_order", (row["id"],))]
+        poem = {"filename": pages[0] if pages else "", "title": row["title"], "text": row["text"], "pages": pages}
+        poem.update(json.loads(row["extra"]))
+        return poem
+
+    def poem(self, poem_id):
+        """Poem as a dict in ocr_output.json format, or None"""
+        row = self.db.execute("SELECT * FROM poems WHERE id = ?", (poem_id,)).fetchone()
+        return self._poem(row) if row is not None else None
+
+    def poems(self):
+        """(poem id, poem dict) in output order"""
+        for row in self.db.execute("SELECT * FROM poems ORDER BY position"):
+            yield row["id"], self._poem(row)
+
+    def poem_ids(self):
+        """(poem id, page filenames) in output order, without loading any text"""
+        pages = {}
+        for row in self.db.execute("SELECT poem_id, filename FROM pages ORDER BY poem_id, page_order"):
+            pages.setdefault(row["poem_id"], []).append(row["filename"])
+        return [(row["id"], pages.get(row["id"], []))
+                for row in self.db.execute("SELECT id FROM poems ORDER BY position")]
+
+    def poem_for_page(self, filename):
+        """Id of the poem that holds a page, or None"""
+        row = self.db.execute("SELECT poem_id FROM pages WHERE filename = ?", (filename,)).fetchone()
+        return row["poem_id"] if row is not None else None
+
+    def poems_titled(self, title):
+        """Ids of poems with this title (case-insensitive), in output order"""
+        return [row["id"] for row in self.db.execute(
+            "SELECT id FROM poems WHERE title = ? COLLATE NOCASE ORDER BY position", (title,))]
+
+    def pages_of(self, title):
+        """Page filenames of the poem(s) titled title, in order"""
+        return [row["filename"] for row in self.db.execute(
+            "SELECT pages.filename FROM pages JOIN poems ON poems.id = pages.poem_id "
+            "WHERE poems.title = ? COLLATE NOCASE ORDER BY poems.position, pages.page_order", (title,))]
+
+    def untitled_pages(self):
+        """(filename, poem id) of every page of an "Untitled" poem, in output order"""
+        return [(row["filename"], row["poem_id"]) for row in self.db.execute(
+            "SELECT pages.filename, pages.poem_id FROM pages JOIN poems ON poems.id = pages.poem_id "
+            "WHERE poems.title = 'untitled' COLLATE NOCASE ORDER BY poems.position, pages.page_order")]
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM poems").fetchone()[0]
+
+    # --- Writing (inside "with store.transaction():", which commits them) ---
+
+    def add_poem(self, poem, position=None):
+        """Insert a poem dict (ocr_output.json format), at the end unless a position is given; returns its id"""
+        if position is None:
+            position = self.db.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM poems").fetchone()[0]
+        extra = {key: value for key, value in poem.items() if key not in POEM_FIELDS}
+        poem_id = self.db.execute("INSERT INTO poems (position, title, text, extra) VALUES (?, ?, ?, ?)",
+                                  (position, poem["title"], poem["text"], json.dumps(extra, ensure_ascii=False))).lastrowid
+        pages = poem.get("pages") or [poem["filename"]]
+        # A page belongs to one poem; a page listed again moves to the newer poem
+        self.db.executemany("INSERT OR REPLACE INTO pages (filename, poem_id, page_order) VALUES (?, ?, ?)",
+                            [(filename, poem_id, order) for order, filename in enumerate(pages)])
+        return poem_id
+
+    def update_poem(self, poem_id, title=None, text=None, **extra):
+        """Change a poem's title and/or text, and set (or with None, drop) extra fields such as confidence"""
+        if title is not None:
+            self.db.execute("UPDATE poems SET title = ? WHERE id = ?", (title, poem_id))
+        if text is not None:
+            self.db.execute("UPDATE poems SET text = ? WHERE id = ?", (text, poem_id))
+        if extra:
+            row = self.db.execute("SELECT extra FROM poems WHERE id = ?", (poem_id,)).fetchone()
+            fields = json.loads(row["extra"])
+            for key, value in extra.items():
+                if value is None:
+                    fields.pop(key, None)
+                else:
+                    fields[key] = value
+            self.db.execute("UPDATE poems SET extra = ? WHERE id = ?", (json.dumps(fields, ensure_ascii=False), poem_id))
+
+    def remove_poem(self, poem_id):
+        """Delete a poem and its page rows"""
+        self.db.execute("DELETE FROM poems WHERE id = ?", (poem_id,))
+
+    def split_out_page(self, poem_id, new_poem):
+        """Give one page of a poem its own poem entry (a title found by re-ocr.py or apply_review.py).
+
+        A single-page poem is replaced in place. A multi-page poem loses the
+        page and new_poem is added at the end. Returns the new poem's id.
+        """
+        pages = [row["filename"] for row in self.db.execute(
+            "SELECT filename FROM pages WHERE poem_id = ? ORDER BY page_order", (poem_id,))]
+        if len(pages) > 1:
+            self.db.execute("DELETE FROM pages WHERE filename = ? AND poem_id = ?", (new_poem["filename"], poem_id))
+            return self.add_poem(new_poem)
+        position = self.db.execute("SELECT position FROM poems WHERE id = ?", (poem_id,)).fetchone()["position"]
+        self.remove_poem(poem_id)
+        return self.add_poem(new_poem, position)
+
+    # --- JSON compatibility ---
+
+    def import_json(self, path=JSON_PATH):
+        """Replace the store's contents with a poems file in ocr_output.json format; returns the poem count"""
+        with open(path, "r", encoding="utf-8") as f:
+            ocr_results = json.load(f)
+        with self.db:
+            self.db.execute("DELETE FROM pages")
+            self.db.execute("DELETE FROM poems")
+            for position, poem in enumerate(ocr_results):
+                self.add_poem(poem, position)
+            self._set_meta("json_stamp", _file_stamp(path))
+        return len(ocr_results)
+
+    def export_json(self, path=JSON_PATH):
+        """Write every poem to path in ocr_output.json format (atomically); returns the poem count"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([poem for _, poem in self.poems()], f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        with self.db:
+            self._set_meta("json_stamp", _file_stamp(path))
+        return len(self)
+
+    def sync_from(self, path=JSON_PATH):
+        """Re-import path if it changed since the store last imported or exported it (e.g. after ocr.py); True if it did"""
+        if not os.path.exists(path):
+            return False
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'json_stamp'").fetchone()
+        if row is not None and row["value"] == _file_stamp(path):
+            return False
+        self.import_json(path)
+        return True
+
+    def _set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+def open_store(path=STORE_PATH, json_path=JSON_PATH):
+    """Open the store, first importing json_path if it is new or was rewritten by another tool"""
+    store = OCRStore(path)
+    if store.sync_from(json_path):
+        print(f"Imported {len(store)} poems from {json_path} into {path}")
+    return store
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the OCR result store or convert it from/to ocr_output.json")
+    parser.add_argument("--store", default=STORE_PATH)
+    parser.add_argument("--import", dest="import_path", metavar="JSON", help="replace the store's poems with this file")
+    parser.add_argument("--export", metavar="JSON", help="write the store's poems to this file")
+    parser.add_argument("--untitled", action="store_true", help="list the pages of untitled poems")
+    parser.add_argument("--poem", metavar="TITLE", help="list the pages of the poem(s) with this title")
+    parser.add_argument("--page", metavar="FILENAME", help="show which poem holds this page")
+    args = parser.parse_args()
+
+    with OCRStore(args.store) as store:
+        if args.import_path:
+            print(f"Imported {store.import_json(args.import_path)} poems from {args.import_path}")
+        if args.untitled:
+            for filename, poem_id in store.untitled_pages():
+                print(f"  {filename} (poem {poem_id})")
+        if args.poem:
+            for filename in store.pages_of(args.poem):
+                print(f"  {filename}")
+        if args.page:
+            poem_id = store.poem_for_page(args.page)
+            poem = store.poem(poem_id) if poem_id is not None else None
+            print(f"  {args.page}: " + (f"'{poem['title']}' ({', '.join(poem['pages'])})" if poem else "not in the store"))
+        if args.export:
+            print(f"Exported {store.export_json(args.export)} poems to {args.export}")
+        print(f"{len(store)} poems in {args.store}")
@@ -0,0 +1,89 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+class Tracer:
+    """Collects timed spans as Chrome trace events ("X" complete events, microseconds)"""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events = []
+
+    def add(self, name, started, finished, **args):
+        """Record a span from two perf_counter() readings"""
+        self.events.append({
+            "name": name,
+            "ph": "X",
+            "ts": (started - self.origin) * 1e6,
+            "dur": (finished - started) * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args
+        })
+
+    @contextmanager
+    def span(self, name, stages=None, **args):
+        """Time a block; with a stages dict, also store its seconds under stages[name]"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            self.add(name, started, finished, **args)
+            if stages is not None:
+                stages[name] = finished - started
+
+    def write_chrome_trace(self, path):
+        """Write the spans in Chrome trace format (open in chrome://tracing or Perfetto)"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+# The active tracer, or None when tracing is off (the default)
+_tracer = None
+
+def enable():
+    """Turn tracing on for this process and return the tracer"""
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+def active():
+    return _tracer
+
+def span(name, stages=None, **args):
+    """Time a block when tracing is on; a no-op context otherwise"""
+    return _tracer.span(name, stages, **args) if _tracer is not None else nullcontext()
+
+def summarize(records, top=5):
+    """End-of-run summary of per-page stage timings and token counts from traced OCR records"""
+    traced = [record for record in records if "stages" in record]
+    if not traced:
+        return "No traced pages (every page came from the cache or a worker)."
+
+    totals = {}
+    for record in traced:
+        for stage, seconds in record["stages"].items():
+            totals[stage] = totals.get(stage, 0.0) + seconds
+    overall = sum(totals.values()) or 1.0
+
+    lines = [f"Traced {len(traced)} pages:"]
+    for stage, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+        lines.append(f"  {stage:<20}{seconds:>9.2f}s  {seconds / overall:>6.1%}")
+
+    token_totals = {}
+    for record in traced:
+        for kind, count in record["tokens"].items():
+            token_totals[kind] = token_totals.get(kind, 0) + count
+    lines.append("  tokens: " + ", ".join(f"{count} {kind}" for kind, count in token_totals.items()))
+
+    lines.append(f"Slowest {min(top, len(traced))} pages:")
+    slowest = sorted(traced, key=lambda record: -sum(record["stages"].values()))[:top]
+    for record in slowest:
+        stages = record["stages"]
+        bound = "prefill-bound" if stages.get("prefill", 0.0) > stages.get("decode", 0.0) else "decode-bound"
+        lines.append(f"  {record['filename']}: {sum(stages.values()):.2f}s, {bound} "
+                     f"(prefill {stages.get('prefill', 0.0):.2f}s, decode {stages.get('decode', 0.0):.2f}s, "
+                     f"{record['tokens']['visual']} visual / {record['tokens']['generated']} generated tokens)")
+    return "\n".join(lines)
@@ -0,0 +1,185 @@
+import os
+import stat
+import secrets
+import argparse
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+# Where the worker listens unless told otherwise: "host:port" or a Unix socket path
+DEFAULT_ADDRESS = os.environ.get("OCR_WORKER_ADDRESS", "localhost:6001")
+# Shared secret between worker and clients: OCR_WORKER_AUTHKEY, else a random key kept in this
+# owner-only (0600) file, created by the first worker. The worker unpickles requests and opens the
+# paths they name, so the key must not be guessable.
+AUTHKEY_PATH = os.environ.get("OCR_WORKER_AUTHKEY_FILE", os.path.expanduser("~/.jr-ocr-worker.key"))
+PUBLIC_AUTHKEYS = {"jr-ocr"}  # The old built-in default, known to anyone who has read this file
+
+def load_authkey(create=False):
+    """The worker's key as bytes; None if there is none yet and create is False.
+
+    Refuses the old public default and a key file that other users can read.
+    """
+    key = os.environ.get("OCR_WORKER_AUTHKEY")
+    if key is not None:
+        if not key or key in PUBLIC_AUTHKEYS:
+            raise RuntimeError("OCR_WORKER_AUTHKEY is empty or the public default; set a random secret "
+                               "or unset it to use a generated key file")
+        return key.encode("utf-8")
+
+    if create and not os.path.exists(AUTHKEY_PATH):
+        try:
+            fd = os.open(AUTHKEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass  # Another worker made it first
+        else:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(secrets.token_hex(32))
+    try:
+        mode = os.stat(AUTHKEY_PATH).st_mode
+    except FileNotFoundError:
+        return None
+    if os.name == "posix" and mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise RuntimeError(f"{AUTHKEY_PATH} is readable by other users; run: chmod 600 {AUTHKEY_PATH}")
+    with open(AUTHKEY_PATH, "r", encoding="utf-8") as f:
+        key = f.read().strip()
+    if not key or key in PUBLIC_AUTHKEYS:
+        raise RuntimeError(f"{AUTHKEY_PATH} holds an empty or public key; delete it to generate a new one")
+    return key.encode("utf-8")
+
+def parse_address(address):
+    """Turn "host:port" into a TCP address tuple; anything else is a Unix socket path"""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and os.sep not in address:
+        return (host or "localhost", int(port))
+    return address
+
+class OCRWorkerClient:
+    """Connection to a running ocr_worker.py; sends page jobs and returns transcriptions"""
+
+    def __init__(self, connection, address):
+        self.connection = connection
+        self.address = address
+
+    def ocr(self, pages, prompt_text, model_id, max_new_tokens):
+        """Transcribe pages (image paths, or (path, crop_box) tuples) with one worker request"""
+        return [result["text"] for result in self.ocr_pages(pages, prompt_text, model_id, max_new_tokens)]
+
+    def ocr_pages(self, pages, prompt_text, model_id, max_new_tokens, loop_guard=True, time_budget=None,
+                  pixel_budget=None, quantize=None, confidence=False):
+        """Like ocr(), but returns ocr.ocr_pages()-style {"text", "stop_reason"} dicts"""
+        jobs = []
+        for page in pages:
+            path, crop = page if isinstance(page, tuple) else (page, None)
+            # The worker may run from a different directory
+            jobs.append({"path": os.path.abspath(path), "crop": crop})
+        self.connection.send({
+            "model": model_id,
+            "prompt": prompt_text,
+            "max_new_tokens": max_new_tokens,
+            "loop_guard": loop_guard,
+            "time_budget": time_budget,
+            "pixel_budget": pixel_budget,
+            "quantize": quantize,
+            "confidence": confidence,
+            "pages": jobs
+        })
+        reply = self.connection.recv()
+        if "error" in reply:
+            raise RuntimeError(f"OCR worker error: {reply['error']}")
+        return reply["results"]
+
+    def close(self):
+        self.connection.close()
+
+def connect(address=DEFAULT_ADDRESS):
+    """Connect to a running worker, or return None if nothing is listening"""
+    authkey = load_authkey()
+    if authkey is None:
+        return None  # No worker has been started with a generated key yet
+    try:
+        connection = Client(parse_address(address), authkey=authkey)
+    except (ConnectionRefusedError, FileNotFoundError):
+        return None
+    except AuthenticationError:
+        print(f"Warning: the OCR worker at {address} rejected our key ({AUTHKEY_PATH}), not using it")
+        return None
+    return OCRWorkerClient(connection, address)
+
+def serve(address=DEFAULT_ADDRESS, preload=()):
+    """Keep models warm and answer page jobs until interrupted"""
+    authkey = load_authkey(create=True)
+
+    # Imported here so thin clients never pull in torch/transformers
+    from PIL import Image
+    from page_images import load_page
+    import ocr
+
+    for model_id in preload:
+        print(f"Loading {model_id}...")
+        ocr.load_model(model_id)
+
+    # One model instance serves every connection, one request at a time
+    model_lock = threading.Lock()
+
+    def handle(connection):
+        with connection:
+            while True:
+                try:
+                    request = connection.recv()
+                except EOFError:
+                    return
+                try:
+                    images = []
+                    for job in request["pages"]:
+                        if job["crop"]:
+                            with Image.open(job["path"]) as img:
+                                images.append(img.crop(tuple(job["crop"])))
+                        else:
+                            images.append(load_page(job["path"], request.get("pixel_budget")))
+                    with model_lock:
+                        results = ocr.ocr_pages(images, request["prompt"],
+                                                max_new_tokens=request["max_new_tokens"],
+                                                model_id=request["model"],
+                                                loop_guard=request.get("loop_guard", True),
+                                                time_budget=request.get("time_budget"),
+                                                pixel_budget=request.get("pixel_budget"),
+                                                quantize=request.get("quantize"),
+                                                confidence=request.get("confidence", False))
+                    connection.send({"results": results})
+                    print(f"  Served {len(results)} page(s) with {request['model']}")
+                except Exception as e:
+                    connection.send({"error": f"{type(e).__name__}: {e}"})
+
+    listener_address = parse_address(address)
+    if isinstance(listener_address, str) and os.path.exists(listener_address):
+        os.remove(listener_address)  # Stale socket from a previous run
+    # A Unix socket is created owner-only, so other users can't even reach the handshake
+    old_umask = os.umask(0o177) if isinstance(listener_address, str) else None
+    try:
+        listener = Listener(listener_address, authkey=authkey)
+    finally:
+        if old_umask is not None:
+            os.umask(old_umask)
+    with listener:
+        print(f"OCR worker listening on {address}")
+        while True:
+            try:
+                connection = listener.accept()  # Runs the authkey handshake
+            except (AuthenticationError, EOFError, OSError) as e:
+                # A stale key or a port probe must not take the worker down for everyone
+                print(f"  Rejected a connection: {type(e).__name__}: {e}")
+                continue
+            threading.Thread(target=handle, args=(connection,), daemon=True).start()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-lived OCR worker that keeps models loaded between script runs")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS,
+                        help=f"host:port or Unix socket path (default {DEFAULT_ADDRESS})")
+    parser.add_argument("--preload", action="append", default=[], metavar="MODEL_ID",
+                        help="load this model at startup instead of on the first request (repeatable)")
+    args = parser.parse_args()
+
+    try:
+        serve(args.address, args.preload)
+    except KeyboardInterrupt:
+        print("\nOCR worker stopped.")
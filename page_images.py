@@ -0,0 +1,57 @@
+import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from PIL import Image
+
+def budget_size(width, height, max_pixels=None, min_pixels=None, long_edge=None):
+    """Size a width x height page should be scaled to so it fits the pixel budget.
+
+    long_edge caps the longer side, max_pixels caps the area and min_pixels
+    scales small pages up. Aspect ratio is kept; None means no limit.
+    """
+    scale = 1.0
+    if long_edge and max(width, height) * scale > long_edge:
+        scale = long_edge / max(width, height)
+    if max_pixels and width * height * scale * scale > max_pixels:
+        scale = math.sqrt(max_pixels / (width * height))
+    if min_pixels and width * height * scale * scale < min_pixels:
+        scale = math.sqrt(min_pixels / (width * height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def fit_pixel_budget(image, max_pixels=None, min_pixels=None, long_edge=None):
+    """Resize a PIL image to its budget_size(), returning it unchanged if it already fits"""
+    size = budget_size(image.width, image.height, max_pixels, min_pixels, long_edge)
+    if size == image.size:
+        return image
+    return image.resize(size, Image.LANCZOS)
+
+def load_page(path, pixel_budget=None):
+    """Decode a scan into an RGB image that fits pixel_budget, closing the file before returning.
+
+    For JPEGs, draft mode lets libjpeg decode straight at a reduced scale (the
+    smallest 1/2, 1/4 or 1/8 step still at least as large as the target), so
+    the full-resolution bitmap is never built.
+    """
+    with Image.open(path) as img:
+        if pixel_budget:
+            img.draft("RGB", budget_size(img.width, img.height, **pixel_budget))
+        page = img.convert("RGB")
+    if pixel_budget:
+        page = fit_pixel_budget(page, **pixel_budget)
+    return page
+
+def prefetch(items, load, workers=2, queue_size=8):
+    """Yield (item, load(item)) in order while a thread pool runs load() on the items ahead.
+
+    At most queue_size loads are queued or finished but not yet consumed, so
+    memory stays bounded however long items is.
+    """
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque((item, pool.submit(load, item)) for item in islice(items, queue_size))
+        while pending:
+            item, future = pending.popleft()
+            for next_item in islice(items, 1):
+                pending.append((next_item, pool.submit(load, next_item)))
+            yield item, future.result()
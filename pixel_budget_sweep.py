@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import argparse
+from PIL import Image
+import ocr
+from ocr_metrics import character_error_rate
+from page_images import fit_pixel_budget
+
+# Budgets tried when none are given on the command line
+DEFAULT_BUDGETS = ["full", "long_edge=2048", "long_edge=1536", "long_edge=1280", "long_edge=1024", "long_edge=768"]
+
+def parse_budget(spec):
+    """Turn "full" or "key=value[,key=value]" (max_pixels, min_pixels, long_edge) into a pixel budget"""
+    if spec == "full":
+        return None
+    budget = {}
+    for part in spec.split(","):
+        key, _, value = part.partition("=")
+        if key not in ("max_pixels", "min_pixels", "long_edge") or not value.isdigit():
+            raise ValueError(f"Bad budget '{spec}': expected e.g. long_edge=1280 or max_pixels=800000")
+        budget[key] = int(value)
+    return budget
+
+def visual_token_count(image):
+    """Number of visual tokens the Qwen2-VL processor produces for an image"""
+    processor, _ = ocr.load_model()
+    grid_thw = processor.image_processor(images=[image], return_tensors="pt")["image_grid_thw"]
+    merge_size = processor.image_processor.merge_size
+    return int(grid_thw.prod()) // (merge_size * merge_size)
+
+def run_budget(pages, budget):
+    """OCR every (path, reference) pair at one budget, returning per-page measurements"""
+    processor, _ = ocr.load_model()
+    results = []
+    for path, reference in pages:
+        with Image.open(path) as img:
+            img.load()
+            resized = fit_pixel_budget(img, **budget) if budget else img
+            started = time.perf_counter()
+            page = ocr.ocr_pages([resized], ocr.OCR_PROMPT)[0]
+            latency = time.perf_counter() - started
+        results.append({
+            "filename": os.path.basename(path),
+            "size": list(resized.size),
+            "visual_tokens": visual_token_count(resized),
+            "generated_tokens": len(processor.tokenizer(page["text"]).input_ids),
+            "latency": latency,
+            "cer": character_error_rate(page["text"], reference),
+            "stop_reason": page["stop_reason"]
+        })
+        print(f"  {os.path.basename(path)}: {latency:.1f}s, CER {results[-1]['cer']:.3f}")
+    return results
+
+def summarize(spec, results):
+    count = len(results)
+    return {
+        "budget": spec,
+        "pages": count,
+        "mean_latency": sum(r["latency"] for r in results) / count,
+        "mean_visual_tokens": sum(r["visual_tokens"] for r in results) / count,
+        "mean_generated_tokens": sum(r["generated_tokens"] for r in results) / count,
+        "mean_cer": sum(r["cer"] for r in results) / count
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure OCR latency, tokens and CER at several pixel budgets")
+    parser.add_argument("pages", nargs="*", help="page images (default: every image in img/ with a reference)")
+    parser.add_argument("--references", default="references",
+                        help="folder of reference transcriptions named <image stem>.txt (default references/)")
+    parser.add_argument("--budget", action="append", dest="budgets", metavar="SPEC",
+                        help="'full' or e.g. long_edge=1280, max_pixels=800000 (repeatable)")
+    parser.add_argument("--max-cer-increase", type=float, default=0.005,
+                        help="quality loss allowed vs. the first budget when recommending (default 0.005)")
+    parser.add_argument("--output", default="pixel_budget_sweep.json", help="machine-readable results")
+    args = parser.parse_args()
+
+    paths = args.pages or [os.path.join("img", f) for f in sorted(os.listdir("img"))
+                           if f.lower().endswith((".jpg", ".jpeg", ".png"))]
+    pages = []
+    for path in paths:
+        reference_path = os.path.join(args.references, os.path.splitext(os.path.basename(path))[0] + ".txt")
+        if os.path.exists(reference_path):
+            with open(reference_path, "r", encoding="utf-8") as f:
+                pages.append((path, f.read().strip()))
+        elif args.pages:
+            print(f"Warning: no reference for {path}, skipping")
+    if not pages:
+        parser.error(f"no pages with reference text in {args.references}/")
+
+    specs = args.budgets or DEFAULT_BUDGETS
+    budgets = [(spec, parse_budget(spec)) for spec in specs]
+
+    summaries = []
+    per_page = {}
+    for spec, budget in budgets:
+        print(f"\nBudget {spec}:")
+        results = run_budget(pages, budget)
+        per_page[spec] = results
+        summaries.append(summarize(spec, results))
+
+    print(f"\n{'budget':<24}{'latency s':>10}{'visual tok':>12}{'gen tok':>10}{'CER':>8}")
+    for summary in summaries:
+        print(f"{summary['budget']:<24}{summary['mean_latency']:>10.2f}{summary['mean_visual_tokens']:>12.0f}"
+              f"{summary['mean_generated_tokens']:>10.0f}{summary['mean_cer']:>8.3f}")
+
+    # Cheapest budget whose CER stays within the allowed increase over the first one
+    allowed_cer = summaries[0]["mean_cer"] + args.max_cer_increase
+    acceptable = [summary for summary in summaries if summary["mean_cer"] <= allowed_cer]
+    recommended = min(acceptable, key=lambda summary: summary["mean_latency"])
+    print(f"\nRecommended: {recommended['budget']} (CER {recommended['mean_cer']:.3f}, "
+          f"{recommended['mean_latency']:.2f}s/page)")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"summaries": summaries, "pages": per_page, "recommended": recommended["budget"]},
+                  f, ensure_ascii=False, indent=2)
+    print(f"Saved results to {args.output}")
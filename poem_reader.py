@@ -0,0 +1,155 @@
+import os
+import re
+import json
+import codecs
+import argparse
+from ocr_store import OCRStore
+
+# Bytes read at a time while indexing a JSON array
+CHUNK_SIZE = 1 << 16
+
+# Paths read through ocr_store.OCRStore instead of as JSON
+STORE_SUFFIXES = (".db", ".sqlite")
+
+def get_lowest_filename_number(poem):
+    """Extract the lowest number from the poem's filenames (e.g. "07.JPG" -> 7); 999 if there is none"""
+    if isinstance(poem, dict):
+        filenames = poem.get("pages", [poem.get("filename", "999.jpg")])
+    elif isinstance(poem, list):
+        filenames = poem if poem else ["999.jpg"]
+    else:
+        return 999
+
+    numbers = []
+    for filename in filenames:
+        if isinstance(filename, str):
+            match = re.search(r'(\d+)', filename)
+            if match:
+                numbers.append(int(match.group(1)))
+    return min(numbers) if numbers else 999
+
+def poem_name(poem, i, used=None):
+    """Stable file name (no extension) for a poem's own output file, from its first scan, so reordering renames nothing.
+
+    With a set of names already taken, a clash (two poems starting on the same
+    scan name) gets underscores appended and the result is added to the set.
+    """
+    filenames = (poem.get("pages") or [poem.get("filename")]) if isinstance(poem, dict) else []
+    stem = os.path.splitext(filenames[0])[0] if filenames and filenames[0] else f"{i+1:03d}"
+    name = "poem-" + re.sub(r'[^A-Za-z0-9_-]', '_', stem)
+    if used is not None:
+        while name in used:
+            name += "_"
+        used.add(name)
+    return name
+
+def _scan_jsonl(f):
+    """(byte offset, byte length, record) for every complete line of a JSONL file"""
+    offset = 0
+    for line in f:
+        if line.endswith(b"\n") and line.strip():
+            yield offset, len(line), json.loads(line)
+        offset += len(line)
+
+def _scan_json_array(f):
+    """(byte offset, byte length, element) for every element of a top-level JSON array, one element in memory at a time"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    base = 0  # Byte offset of buffer[0] in the file
+    started = False
+    eof = False
+    while True:
+        # Skip the separators between elements
+        position = 0
+        while position < len(buffer):
+            char = buffer[position]
+            if char == "[" and not started:
+                started = True
+            elif not (char.isspace() or char == "," and started):
+                break
+            position += 1
+        if position:
+            base += len(buffer[:position].encode("utf-8"))
+            buffer = buffer[position:]
+
+        if buffer and not started:
+            raise ValueError("expected a JSON array of poems")
+        if buffer.startswith("]"):
+            return
+        if buffer:
+            try:
+                element, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                if end < len(buffer) or eof:  # A number or literal could continue in the next chunk
+                    length = len(buffer[:end].encode("utf-8"))
+                    yield base, length, element
+                    base += length
+                    buffer = buffer[end:]
+                    continue
+        if eof:
+            if started:
+                raise ValueError("JSON array is not closed")
+            return
+        chunk = f.read(CHUNK_SIZE)
+        eof = not chunk
+        buffer += utf8.decode(chunk, final=eof)
+
+class PoemReader:
+    """Poems of an OCR output file, read lazily in get_lowest_filename_number order.
+
+    Opening the reader makes one pass over the file and keeps only the sort
+    key, byte offset and length of each poem; iterating seeks to each poem in
+    turn and parses just that one, so memory stays at one poem (plus the
+    small index) however large the file is. Works on the JSON array written
+    by ocr.py (ocr_output.json), on JSONL with one poem per line (e.g.
+    assemble_poems.py --output poems.jsonl) and on the SQLite store of
+    ocr_store.py (*.db), where the index is built from the page table alone.
+    Iterating again re-reads the file, so a reader can be walked more than once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = []
+        if path.endswith(STORE_SUFFIXES):
+            with OCRStore(path) as store:
+                for poem_id, pages in store.poem_ids():
+                    self.index.append((get_lowest_filename_number({"pages": pages}), poem_id, None))
+        else:
+            with open(path, "rb") as f:
+                scan = _scan_jsonl if path.endswith(".jsonl") else _scan_json_array
+                for offset, length, poem in scan(f):
+                    self.index.append((get_lowest_filename_number(poem), offset, length))
+        self.index.sort(key=lambda entry: entry[0])  # Stable, so ties keep file order as list.sort did
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        if self.path.endswith(STORE_SUFFIXES):
+            with OCRStore(self.path) as store:
+                for _, poem_id, _ in self.index:
+                    yield store.poem(poem_id)
+            return
+        with open(self.path, "rb") as f:
+            for _, offset, length in self.index:
+                f.seek(offset)
+                yield json.loads(f.read(length).decode("utf-8"))
+
+def iter_poems(path):
+    """Poems of path in get_lowest_filename_number order, one at a time"""
+    return iter(PoemReader(path))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the poems of an OCR output file in the order the exporters use")
+    parser.add_argument("path", nargs="?", default="ocr_output.json")
+    args = parser.parse_args()
+
+    reader = PoemReader(args.path)
+    for poem in reader:
+        pages = poem.get("pages") or [poem.get("filename")]
+        print(f"{get_lowest_filename_number(poem):>4}  {poem.get('title', '')}  ({', '.join(map(str, pages))})")
+    print(f"{len(reader)} poems in {args.path} ({os.path.getsize(args.path) / 1024:.0f} KB)")
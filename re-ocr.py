@@ -1,143 +1,349 @@
 import os
-import json
-from transformers import AutoProcessor, AutoModelForImageTextToText
+import argparse
+from contextlib import nullcontext
+from transformers import AutoProcessor, AutoModelForImageTextToText, StoppingCriteriaList, LogitsProcessorList
 from PIL import Image
 import torch
-import re
+from ocr_cache import OCRCache, file_digest
+import ocr_worker
+from ocr_stopping import RepetitionLoopCriteria
+from ocr_quantize import quantize_model, QUANTIZE_MODES
+from ocr_rules import get_rules
+from apply_review import write_review, REVIEW_PATH
+from ocr_confidence import TokenLogprobRecorder, score_tokens, needs_review, merge_lines, lines_text
+from ocr_journal import PageJournal, read_journal, JOURNAL_PATH
+from assemble_poems import latest_pages
+from ocr_speculative import PriorTextCandidateGenerator, drafting
+from ocr_store import open_store, STORE_PATH, JSON_PATH
 
-# Load model & processor (same as before)
-processor = AutoProcessor.from_pretrained("JackChew/Qwen2-VL-2B-OCR")
-model = AutoModelForImageTextToText.from_pretrained("JackChew/Qwen2-VL-2B-OCR").to(
-    torch.device("cuda" if torch.cuda.is_available() else "cpu")
-)
+MODEL_ID = "JackChew/Qwen2-VL-2B-OCR"
+MAX_NEW_TOKENS = 2048
+QUANTIZE = None  # Set from --quantize
+DRAFT_TOKENS = 10  # Candidate tokens proposed from the prior transcription per pass (0 turns drafting off)
 
-# OCR function (same as before)
-def ocr_image(image, prompt_text):
+# Prompts tried on every page; the first is the one ocr.py uses
+PROMPTS = [
+    "Transcribe all text from this document exactly as written, preserving line breaks and spacing.",
+    "Read all the text in this image carefully, including the title at the top.",
+    "Extract all visible text from this page, maintaining the original formatting."
+]
+
+# Load model & processor (same as ocr.py, on first use)
+processor = None
+model = None
+
+def load_model():
+    """Load the OCR model and processor once"""
+    global processor, model
+    if model is None:
+        processor = AutoProcessor.from_pretrained(MODEL_ID)
+        model = AutoModelForImageTextToText.from_pretrained(MODEL_ID).to(
+            torch.device("cuda" if torch.cuda.is_available() and not QUANTIZE else "cpu")
+        )
+        if QUANTIZE:
+            quantize_model(model, QUANTIZE)
+    return processor, model
+
+def vision_tower(model):
+    """The Qwen2-VL vision encoder (its attribute path moved between transformers releases)"""
+    return model.visual if hasattr(model, "visual") else model.model.visual
+
+def encode_page(image, digest=None, cache_dir=None):
+    """Run the image processor and vision tower once, returning features every prompt can reuse.
+
+    With cache_dir and the image's digest the features are also kept on disk,
+    so later re-runs skip the vision pass entirely. Only the grid and the
+    embeddings are kept; the pixels themselves are never needed again.
+    """
+    load_model()
+    cache_path = None
+    if cache_dir and digest:
+        variant = f"-{QUANTIZE}" if QUANTIZE == "int8-vision" else ""  # Only a quantized tower changes the features
+        cache_path = os.path.join(cache_dir, f"{digest}-{MODEL_ID.replace('/', '--')}{variant}.pt")
+        if os.path.exists(cache_path):
+            features = torch.load(cache_path, map_location=model.device)
+            features.pop("pixel_values", None)  # Written by older versions, and never read
+            return features
+
+    image_inputs = processor.image_processor(images=[image], return_tensors="pt").to(model.device)
+    visual = vision_tower(model)
+    with torch.no_grad():
+        image_embeds = visual(image_inputs["pixel_values"].type(next(visual.parameters()).dtype),
+                              grid_thw=image_inputs["image_grid_thw"])
+    features = {
+        "image_grid_thw": image_inputs["image_grid_thw"],
+        "image_embeds": image_embeds
+    }
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        torch.save(features, cache_path + ".tmp")
+        os.replace(cache_path + ".tmp", cache_path)
+    return features
+
+def placeholder_pixel_values(image_grid_thw):
+    """pixel_values of the right shape for generate(), without the memory: the patched vision forward never reads them"""
+    image_processor = processor.image_processor
+    patch_dim = 3 * image_processor.temporal_patch_size * image_processor.patch_size ** 2
+    dtype = next(vision_tower(model).parameters()).dtype
+    return torch.zeros(1, 1, dtype=dtype, device=model.device).expand(int(image_grid_thw.prod()), patch_dim)
+
+def ocr_with_features(features, prompt_text, confidence=False, draft_text=None):
+    """Decode one prompt against precomputed page features; only the text side is processed.
+
+    Returns {"text", "stop_reason"} like ocr.ocr_pages(): stop_reason is None when
+    the model finished on its own, else "repetition" or "max_new_tokens", and such
+    cut-off text must not be cached. With confidence=True the dict also carries
+    "confidence" and "lines". draft_text (an earlier transcription of the page) seeds speculative decoding;
+    the output is unchanged, only fewer forward passes are needed.
+    """
+    load_model()
     conversation = [{
         "role": "user",
         "content": [{"type": "image"}, {"type": "text", "text": prompt_text}]
     }]
     prompt = processor.apply_chat_template(conversation, add_generation_prompt=True)
-    inputs = processor(text=[prompt], images=[image], padding=True, return_tensors="pt").to(model.device)
-    output_ids = model.generate(**inputs, max_new_tokens=2048)
+
+    # Expand the image placeholder to one token per merged patch, as the processor would
+    image_token = getattr(processor, "image_token", "<|image_pad|>")
+    merge_size = processor.image_processor.merge_size
+    num_image_tokens = int(features["image_grid_thw"].prod()) // (merge_size * merge_size)
+    prompt = prompt.replace(image_token, image_token * num_image_tokens)
+    inputs = processor.tokenizer([prompt], return_tensors="pt").to(model.device)
+
+    # Same repeat-loop guard as ocr.py, so a faint scan can't burn all MAX_NEW_TOKENS
+    eos_token_ids = model.generation_config.eos_token_id
+    if not isinstance(eos_token_ids, list):
+        eos_token_ids = [eos_token_ids]
+    loop_criteria = RepetitionLoopCriteria(inputs.input_ids.shape[1], eos_token_ids)
+    stopping_criteria = StoppingCriteriaList([loop_criteria])
+    recorder = TokenLogprobRecorder() if confidence else None
+
+    # Draft from the prior transcription; the confidence recorder needs plain one-token steps
+    generator = None
+    draft_kwargs = {}
+    if draft_text and DRAFT_TOKENS and not confidence:
+        draft_ids = processor.tokenizer(draft_text, add_special_tokens=False).input_ids + eos_token_ids[:1]
+        generator = PriorTextCandidateGenerator(draft_ids, inputs.input_ids.shape[1], eos_token_ids,
+                                                inputs.input_ids.shape[1] + MAX_NEW_TOKENS, DRAFT_TOKENS)
+        draft_kwargs["prompt_lookup_num_tokens"] = DRAFT_TOKENS
+
+    # Hand the cached embeddings back wherever generate() would call the vision tower
+    visual = vision_tower(model)
+    visual.forward = lambda *args, **kwargs: features["image_embeds"]
+    try:
+        with drafting(model, generator) if generator else nullcontext():
+            output_ids = model.generate(**inputs,
+                                        pixel_values=placeholder_pixel_values(features["image_grid_thw"]),
+                                        image_grid_thw=features["image_grid_thw"],
+                                        max_new_tokens=MAX_NEW_TOKENS,
+                                        stopping_criteria=stopping_criteria,
+                                        logits_processor=LogitsProcessorList([recorder] if recorder else []),
+                                        **draft_kwargs)
+    finally:
+        del visual.forward  # Back to the class's real forward
+    if generator:
+        print(f"    Drafted from prior text: {generator.accepted}/{generator.proposed} candidate tokens accepted "
+              f"in {generator.passes} passes")
     generated_ids = [output_ids[len(input_ids):] for input_ids, output_ids in zip(inputs.input_ids, output_ids)]
-    return processor.batch_decode(generated_ids, skip_special_tokens=True)[0].strip()
+    text = processor.batch_decode(generated_ids, skip_special_tokens=True)[0].strip()
+    token_ids = generated_ids[0].tolist()
+    length = next((index for index, token_id in enumerate(token_ids) if token_id in eos_token_ids), None)
+    if loop_criteria.looped is not None and loop_criteria.looped[0]:
+        stop_reason = "repetition"
+    elif length is None:
+        stop_reason = "max_new_tokens"
+    else:
+        stop_reason = None
+    result = {"text": text, "stop_reason": stop_reason}
+    if not recorder:
+        return result
+
+    length = len(token_ids) if length is None else length
+    logprobs = recorder.finish(output_ids)[0].tolist()
+    result["confidence"], result["lines"] = score_tokens(processor.tokenizer, token_ids[:length], logprobs[:length])
+    return result
+
+# OCR function (same as before, now via the shared page features)
+def ocr_image(image, prompt_text):
+    return ocr_with_features(encode_page(image), prompt_text)["text"]
 
 def extract_title_from_text(full_text, debug_filename=""):
-    """Extract title from full OCR text using smart heuristics"""
-    lines = [line.strip() for line in full_text.split('\n') if line.strip()]
-    
-    if debug_filename:
-        print(f"\nDebug - Re-analyzing {debug_filename}:")
-        for i, line in enumerate(lines[:10]):
-            print(f"  {i}: '{line}'")
-    
-    # Look for title in first several lines
-    for i, line in enumerate(lines[:10]):
-        # Skip page numbers and very short lines
-        if line.isdigit() or len(line) < 2:
-            continue
-            
-        # Skip common non-title elements
-        skip_phrases = [
-            "frederick thayer", "oakland", "maryland", "published", "forum",
-            "to a. s. d.", "your face", "word of god", "when i would"
-        ]
-        if any(phrase in line.lower() for phrase in skip_phrases):
-            continue
-            
-        # Check for continuation markers
-        if "(continued)" in line.lower() or "(cont" in line.lower():
-            continue
-            
-        # Skip parenthetical subtitles for now (we'll add them back later)
-        if line.startswith("(") and line.endswith(")"):
-            subtitle = line
-            continue
-            
-        # Look for title characteristics
-        is_likely_title = False
-        
-        # All caps or mostly caps (allowing for some lowercase)
-        if line.isupper() or (sum(1 for c in line if c.isupper()) > len(line) * 0.6):
-            is_likely_title = True
-            
-        # Title case and reasonable length
-        elif line.istitle() and 2 <= len(line) <= 40:
-            is_likely_title = True
-            
-        # Check if it's a short line that's not clearly poem content
-        elif (len(line.split()) <= 4 and 
-              not line.lower().startswith(("when", "the", "and", "but", "or", "in", "on", "at", "to", "from")) and
-              not any(char in line for char in ".,!?;:")):
-            is_likely_title = True
-            
-        if is_likely_title:
-            title = line.strip()
-            
-            # Check if next line is a subtitle in parentheses
-            if i + 1 < len(lines):
-                next_line = lines[i + 1].strip()
-                if next_line.startswith("(") and next_line.endswith(")"):
-                    title += f" {next_line}"
-                    
-            # Clean up spacing (fix OCR issues like "L E G E R D E M A I N")
-            if len(title.split()) > 3 and all(len(word) <= 2 for word in title.split() if word.isalpha()):
-                title = ''.join(title.split())
-                
-            if debug_filename:
-                print(f"  -> Found title: '{title}'")
-            return title
-    
-    if debug_filename:
-        print(f"  -> No title found, using 'Untitled'")
-    return "Untitled"
+    """Extract title from full OCR text using the shared rules (ocr_rules.json)"""
+    return get_rules().extract_title(full_text, debug_filename, debug_label="Re-analyzing")
 
 def clean_poem_text(text, title):
     """Remove title and other metadata from poem text"""
-    lines = text.split('\n')
-    cleaned_lines = []
-    
-    # Remove title lines from the beginning
-    title_words = set(title.lower().replace('(', '').replace(')', '').split())
-    skip_count = 0
-    
-    for i, line in enumerate(lines):
-        line_words = set(line.lower().replace('(', '').replace(')', '').split())
-        
-        # Skip lines that are primarily the title
-        if i < 5 and title_words and len(title_words.intersection(line_words)) > len(title_words) * 0.6:
-            skip_count += 1
-            continue
-            
-        # Skip metadata lines
-        if any(phrase in line.lower() for phrase in ["frederick thayer", "oakland", "maryland", "published"]):
+    return get_rules().clean_text(text, title)
+
+image_folder = "img"
+
+def transcribe_scored(path, digest, prompt, features):
+    """One prompt's {"text", "stop_reason", "confidence", "lines"} for a page, through the cache or the worker.
+
+    features is a one-item list holding the page's vision features once computed.
+    Only transcriptions the model finished on its own are cached.
+    """
+    entry = cache.get_entry(digest, MODEL_ID, prompt, cache_settings)
+    if entry is not None and "confidence" in entry:
+        return dict(entry, stop_reason=None)
+    if worker:
+        result = worker.ocr_pages([path], prompt, MODEL_ID, MAX_NEW_TOKENS, quantize=QUANTIZE, confidence=True)[0]
+    else:
+        if not features:
+            with Image.open(path) as img:
+                features.append(encode_page(img.convert("RGB"), digest, args.vision_cache))
+        result = ocr_with_features(features[0], prompt, confidence=True)
+    if result["stop_reason"] is None:
+        cache.put(digest, MODEL_ID, prompt, cache_settings, result["text"],
+                  confidence=result["confidence"], lines=result["lines"])
+    else:
+        print(f"    ! Cut off ({result['stop_reason']}), not cached")
+    return result
+
+def rescore_low_confidence(store, threshold, journal_path):
+    """Re-run the pages of the journal that scored below threshold and patch them into the store.
+
+    A page whose overall score is low is replaced by whichever prompt's
+    transcription scores best; a page with only some low lines keeps its
+    text and takes just those lines from a surer alternative transcription.
+    """
+    records = latest_pages(read_journal(journal_path))
+    targets = [record for record in records if needs_review(record, threshold)]
+    if not any(record.get("confidence") is not None for record in records):
+        print(f"No confidence scores in {journal_path} (run ocr.py --confidence first)")
+        return
+    print(f"Found {len(targets)} of {len(records)} pages scored below {threshold}")
+
+    pages = {record["filename"]: record for record in records}
+    rules = get_rules()
+    updated = []
+    for i, record in enumerate(targets):
+        filename = record["filename"]
+        path = os.path.join(image_folder, filename)
+        print(f"\nRescoring {i+1}/{len(targets)}: {filename} (page confidence {record['confidence']})")
+        if not os.path.exists(path):
+            print(f"    ✗ File not found: {path}")
             continue
-            
-        cleaned_lines.append(line)
-    
-    return '\n'.join(cleaned_lines).strip()
-
-# Load existing results
-with open("ocr_output.json", "r", encoding="utf-8") as f:
-    ocr_results = json.load(f)
-
-# Find untitled poems and separate individual files
-untitled_files = []
-untitled_poem_indices = []
-
-for i, poem in enumerate(ocr_results):
-    if poem["title"].lower() == "untitled":
-        if "pages" in poem and isinstance(poem["pages"], list):
-            # This poem has multiple pages - process each separately
-            for page_file in poem["pages"]:
-                untitled_files.append(page_file)
-                untitled_poem_indices.append(i)
+        digest = file_digest(path)
+        features = []
+        alternatives = []
+        for prompt in PROMPTS[1:]:  # ocr.py already used the first prompt
+            try:
+                result = transcribe_scored(path, digest, prompt, features)
+                if result["stop_reason"] is None:  # A cut-off transcription can't replace the page or its lines
+                    alternatives.append(result)
+            except Exception as e:
+                print(f"    Error with prompt: {e}")
+
+        if record["confidence"] < threshold:
+            # Whole page in doubt: keep whichever transcription the model is surest of
+            best = max([record] + alternatives, key=lambda result: result["confidence"] or 0.0)
+            if best is record:
+                print("    ✗ No better transcription found")
+                continue
+            text, lines, page_confidence = best["text"], best["lines"], best["confidence"]
+            print(f"    ✓ Replaced page, confidence {record['confidence']} -> {page_confidence}")
         else:
-            # Single page poem
-            filename = poem.get("filename") or poem.get("pages", ["unknown"])[0]
-            untitled_files.append(filename)
-            untitled_poem_indices.append(i)
+            # Only some lines in doubt: swap in just those lines
+            lines, replaced = record["lines"], 0
+            for alternative in alternatives:
+                lines, count = merge_lines(lines, alternative["lines"], threshold)
+                replaced += count
+            if not replaced:
+                print("    ✗ No surer version of its low-confidence lines found")
+                continue
+            text, page_confidence = lines_text(lines), record["confidence"]
+            print(f"    ✓ Replaced {replaced} low-confidence lines")
+
+        pages[filename] = dict(record, text=text, lines=lines, confidence=page_confidence,
+                               title=rules.extract_title(text), is_continuation=rules.is_continuation(text),
+                               cached=False)
+        updated.append(filename)
+
+    if not updated:
+        print("\n✗ No pages were improved.")
+        return
+
+    # The journal keeps the improved pages (last record wins), so later assembly runs see them too
+    with PageJournal(journal_path, resume=True) as journal:
+        for filename in updated:
+            journal.append(pages[filename])
+
+    # Rebuild only the affected poems' text, keeping their titles and everything else as they are
+    updated_set = set(updated)
+    rewritten = skipped = 0
+    with store.transaction():
+        for poem_id in {store.poem_for_page(filename) for filename in updated} - {None}:
+            poem = store.poem(poem_id)
+            missing = [page for page in poem["pages"] if page not in pages]
+            if missing:
+                # Its text can't be rebuilt without every page, so it keeps the old one
+                print(f"  ! '{poem['title']}' not rewritten: {', '.join(missing)} missing from {journal_path}")
+                skipped += 1
+                continue
+            confidence = poem.get("confidence", {})
+            for page in updated_set.intersection(poem["pages"]):
+                confidence[page] = {"page": pages[page]["confidence"], "lines": pages[page]["lines"]}
+            store.update_poem(poem_id, text="\n\n".join(rules.clean_text(pages[page]["text"], pages[page]["title"])
+                                                         for page in poem["pages"]),
+                              confidence=confidence)
+            rewritten += 1
+
+    store.export_json(JSON_PATH)
+    print(f"\n✓ Updated {len(updated)} pages in {journal_path}; rewrote {rewritten} poems in {store.path} "
+          f"(exported to {JSON_PATH})" + (f", skipped {skipped} with pages missing from the journal" if skipped else ""))
+
+parser = argparse.ArgumentParser(description="Re-OCR pages of ocr_output.json that came out 'Untitled'")
+parser.add_argument("--vision-cache", metavar="DIR",
+                    help="keep each page's vision-encoder features in DIR so later re-runs skip the vision pass")
+parser.add_argument("--quantize", choices=QUANTIZE_MODES,
+                    help="dynamic int8 CPU inference: 'int8' for the language model, 'int8-vision' to include the vision tower")
+parser.add_argument("--batch", action="store_true",
+                    help="run unattended: no prompts, pages still untitled go to the review file")
+parser.add_argument("--review-file", default=REVIEW_PATH,
+                    help=f"where --batch queues pages for a human title (default {REVIEW_PATH})")
+parser.add_argument("--min-confidence", type=float, metavar="THRESHOLD",
+                    help="instead of untitled pages, re-run only pages (or lines) scored below THRESHOLD "
+                         "by ocr.py --confidence, e.g. 0.8")
+parser.add_argument("--draft-tokens", type=int, default=DRAFT_TOKENS,
+                    help=f"speculative decoding: candidate tokens per pass drafted from the page's earlier "
+                         f"transcription (default {DRAFT_TOKENS}, 0 to turn off)")
+parser.add_argument("--journal", default=JOURNAL_PATH,
+                    help=f"per-page journal with the confidence scores (default {JOURNAL_PATH})")
+parser.add_argument("--rules", metavar="PATH",
+                    help="title/metadata rules for this collection (default ocr_rules.json)")
+parser.add_argument("--store", default=STORE_PATH,
+                    help=f"SQLite result store, imported from {JSON_PATH} whenever that file is newer "
+                         f"and exported back to it after changes (default {STORE_PATH})")
+args = parser.parse_args()
+QUANTIZE = args.quantize
+DRAFT_TOKENS = args.draft_tokens
+if args.rules:
+    os.environ["OCR_RULES"] = args.rules
+
+# Transcriptions already produced by ocr.py (or an earlier re-run) are served from the cache
+cache = OCRCache()
+cache_settings = {"max_new_tokens": MAX_NEW_TOKENS}
+if QUANTIZE:
+    cache_settings["quantize"] = QUANTIZE
+
+# Send pages to a warm ocr_worker.py if one is running instead of loading the model here
+worker = ocr_worker.connect()
+if worker:
+    print(f"Using OCR worker at {worker.address}")
+
+# Load existing results (each page's update below commits on its own, so an interrupted run keeps its progress)
+store = open_store(args.store, JSON_PATH)
+
+if args.min_confidence is not None:
+    rescore_low_confidence(store, args.min_confidence, args.journal)
+    exit()
+
+# Find untitled poems; every page of a multi-page one is processed separately
+untitled = store.untitled_pages()
+untitled_files = [filename for filename, _ in untitled]
+untitled_poem_ids = [poem_id for _, poem_id in untitled]
 
 if not untitled_files:
     print("No untitled poems found to reprocess!")
@@ -147,17 +353,23 @@ print(f"Found {len(untitled_files)} untitled poem pages to reprocess:")
 for filename in untitled_files:
     print(f"  - {filename}")
 
-# Ask user for confirmation
-response = input(f"\nReprocess these {len(untitled_files)} poem pages individually? (y/n): ")
-if response.lower() != 'y':
-    print("Cancelled.")
-    exit()
+# Ask user for confirmation (unless running unattended)
+if not args.batch:
+    response = input(f"\nReprocess these {len(untitled_files)} poem pages individually? (y/n): ")
+    if response.lower() != 'y':
+        print("Cancelled.")
+        exit()
 
 # Reprocess each untitled file individually
-image_folder = "img"
 updated_count = 0
+review_entries = []  # --batch: pages left for a human to title
+
+# Earlier transcriptions of each page (raw from the journal, else the poem's text) seed speculative decoding
+prior_texts = {filename: store.poem(poem_id)["text"] for filename, poem_id in untitled}
+prior_texts.update((record["filename"], record["text"]) for record in read_journal(args.journal)
+                   if record["filename"] in prior_texts)
 
-for i, (filename, poem_index) in enumerate(zip(untitled_files, untitled_poem_indices)):
+for i, (filename, poem_id) in enumerate(zip(untitled_files, untitled_poem_ids)):
     print(f"\nReprocessing file {i+1}/{len(untitled_files)}: {filename}")
     
     path = os.path.join(image_folder, filename)
@@ -166,18 +378,31 @@ for i, (filename, poem_index) in enumerate(zip(untitled_files, untitled_poem_ind
         continue
         
     img = Image.open(path)
+    digest = file_digest(path)
     
     # Try with different prompts for better results
-    prompts = [
-        "Transcribe all text from this document exactly as written, preserving line breaks and spacing.",
-        "Read all the text in this image carefully, including the title at the top.",
-        "Extract all visible text from this page, maintaining the original formatting."
-    ]
-    
     best_text = ""
-    for prompt in prompts:
+    candidates = []
+    features = None  # Vision pass runs at most once per page, shared by every prompt
+    draft_text = prior_texts.get(filename)
+    for prompt in PROMPTS:
         try:
-            text = ocr_image(img, prompt)
+            text = cache.get(digest, MODEL_ID, prompt, cache_settings)
+            if text is None:
+                if worker:
+                    result = worker.ocr_pages([path], prompt, MODEL_ID, MAX_NEW_TOKENS, quantize=QUANTIZE)[0]
+                else:
+                    if features is None:
+                        features = encode_page(img, digest, args.vision_cache)
+                    result = ocr_with_features(features, prompt, draft_text=draft_text)
+                text = result["text"]
+                # A loop-truncated page would otherwise come back from the cache as clean, for ocr.py too
+                if result["stop_reason"] is None:
+                    cache.put(digest, MODEL_ID, prompt, cache_settings, text)
+                else:
+                    print(f"    ! Cut off ({result['stop_reason']}), not cached")
+            draft_text = text or draft_text  # The latest transcription is the closest draft for the next prompt
+            candidates.append({"prompt": prompt, "text": text})
             if len(text) > len(best_text):  # Use the longest result
                 best_text = text
         except Exception as e:
@@ -200,27 +425,25 @@ for i, (filename, poem_index) in enumerate(zip(untitled_files, untitled_poem_ind
             "pages": [filename]
         }
         
-        # Replace the old untitled entry or add new one
-        if poem_index < len(ocr_results):
-            # Check if this was part of a multi-page untitled poem
-            old_poem = ocr_results[poem_index]
-            if "pages" in old_poem and len(old_poem["pages"]) > 1:
-                # Remove this file from the old poem's pages
-                old_poem["pages"] = [p for p in old_poem["pages"] if p != filename]
-                if not old_poem["pages"]:
-                    # If no pages left, mark for removal
-                    old_poem["_to_remove"] = True
-                # Add as new separate poem
-                ocr_results.append(new_poem)
-            else:
-                # Replace the single untitled poem
-                ocr_results[poem_index] = new_poem
+        # Replace the old untitled entry, or split this page out of a multi-page one
+        with store.transaction():
+            store.split_out_page(poem_id, new_poem)
         
         updated_count += 1
         print(f"    ✓ Updated title to: '{new_title}'")
+    elif args.batch:
+        # Leave it for a human; apply_review.py merges the title later without the model
+        review_entries.append({
+            "filename": filename,
+            "title": "",
+            "text": best_text,
+            "preview": [line.strip() for line in best_text.split('\n')[:5] if line.strip()],
+            "candidates": candidates
+        })
+        print(f"    ✗ Still couldn't extract title from {filename}, queued for review")
     else:
         print(f"    ✗ Still couldn't extract title from {filename}")
-        print(f"    First few lines of extracted text:")
+        print("    First few lines of extracted text:")
         lines = best_text.split('\n')[:5]
         for j, line in enumerate(lines):
             if line.strip():
@@ -245,36 +468,30 @@ for i, (filename, poem_index) in enumerate(zip(untitled_files, untitled_poem_ind
                 }
                 
                 # Replace the old untitled entry or add new one
-                if poem_index < len(ocr_results):
-                    old_poem = ocr_results[poem_index]
-                    if "pages" in old_poem and len(old_poem["pages"]) > 1:
-                        old_poem["pages"] = [p for p in old_poem["pages"] if p != filename] 
-                        if not old_poem["pages"]:
-                            old_poem["_to_remove"] = True
-                        ocr_results.append(new_poem)
-                    else:
-                        ocr_results[poem_index] = new_poem
+                with store.transaction():
+                    store.split_out_page(poem_id, new_poem)
                 
                 updated_count += 1
                 print(f"    ✓ Manually set title to: '{manual_title}'")
             else:
-                print(f"    ✗ No title entered, leaving as 'Untitled'")
+                print("    ✗ No title entered, leaving as 'Untitled'")
         else:
             print(f"    ✗ Skipping {filename}, leaving as 'Untitled'")
 
-# Remove any poems marked for removal
-ocr_results = [poem for poem in ocr_results if not poem.get("_to_remove", False)]
-
-# Save updated results
+# Save updated results (already in the store; the JSON copy is for makePDF.py / makeTex.py)
 if updated_count > 0:
-    with open("ocr_output.json", "w", encoding="utf-8") as f:
-        json.dump(ocr_results, f, ensure_ascii=False, indent=2)
+    store.export_json(JSON_PATH)
     print(f"\n✓ Successfully updated {updated_count} poems!")
-    print("Updated ocr_output.json with new titles.")
+    print(f"Updated {args.store} and {JSON_PATH} with new titles.")
 else:
     print("\n✗ No poems were successfully updated.")
 
-print(f"\nSummary:")
-print(f"  - Attempted to reprocess: {len(untitled_poems)}")
+if review_entries:
+    write_review(review_entries, args.review_file, source=args.store)
+    print(f"Queued {len(review_entries)} pages for review in {args.review_file} "
+          f"(fill in the titles, then run: python apply_review.py {args.review_file})")
+
+print("\nSummary:")
+print(f"  - Attempted to reprocess: {len(untitled_files)}")
 print(f"  - Successfully updated: {updated_count}")
-print(f"  - Still untitled: {len(untitled_poems) - updated_count}")
\ No newline at end of file
+print(f"  - Still untitled: {len(untitled_files) - updated_count}")
\ No newline at end of file